@@ -0,0 +1,16 @@
+import os
+
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+
+class Base64OrFileImageField(Base64ImageField):
+    """Принимает изображение строкой base64 или файлом multipart."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            extension = os.path.splitext(data.name)[1].lower()
+            data.name = self.get_file_name(data) + extension
+            return serializers.ImageField.to_internal_value(self, data)
+        return super().to_internal_value(data)
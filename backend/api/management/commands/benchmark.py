@@ -0,0 +1,439 @@
+import base64
+import json
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+import requests
+from recipes.images import VARIANTS, get_executor, variant_name
+from recipes.models import FavoriteList, Ingredient, Recipe, ShoppingCart, Tag
+from rest_framework.authtoken.models import Token
+from users.models import Subscribe, User
+
+ANONYMOUS = 'anonymous'
+GUEST = 'guest'
+
+Route = namedtuple(
+    'Route', ('name', 'method', 'url', 'data', 'user', 'save'),
+    defaults=(None, None, None)
+)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, int(round(percent / 100 * len(values) + 0.5)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def get_fixtures():
+    """Выбирает из БД объекты, на которых гоняются запросы."""
+    user = User.objects.filter(
+        recipes_count__gt=0
+    ).order_by('-subscribers_count').first()
+    if user is None:
+        raise CommandError(
+            'Нет данных для замера: запустите generate_data.'
+        )
+    viewer = User.objects.exclude(pk=user.pk).order_by(
+        '-recipes_count'
+    ).first() or user
+    subscribed = Subscribe.objects.filter(
+        subscriber=viewer
+    ).values('user')
+    favorited = FavoriteList.objects.filter(user=viewer).values('recipe')
+    in_cart = ShoppingCart.objects.filter(user=viewer).values('recipe')
+    return {
+        'viewer': viewer,
+        'author': User.objects.exclude(
+            pk__in=subscribed
+        ).exclude(pk=viewer.pk).filter(recipes_count__gt=0).first() or user,
+        'recipe': Recipe.objects.exclude(
+            pk__in=favorited
+        ).exclude(pk__in=in_cart).order_by('-favorites_count').first(),
+        'tag': Tag.objects.first(),
+        'ingredient': Ingredient.objects.first(),
+    }
+
+
+def png_base64():
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), 'white').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def get_routes(data):
+    """Маршруты api/urls.py в порядке замера.
+
+    Каждая запись - Route: имя, метод, адрес и, для изменяющих
+    запросов, тело, от чьего имени идёт запрос и что запомнить из
+    ответа. Адрес и тело могут быть функциями от state, куда save
+    складывает id созданных объектов.
+
+    Изменения идут парами, которые возвращают БД в исходное состояние:
+    подписка, избранное и корзина снимаются сразу после установки,
+    созданный рецепт удаляется, а гость, на котором замеряются
+    регистрация, вход, выход и смена пароля, в конце удаляет себя.
+    Не замеряются письма djoser (активация, сброс пароля и почты) и
+    JWT: записи чёрного списка остаются до flushexpiredtokens.
+    """
+    recipe = data['recipe'].pk
+    author = data['author'].pk
+    tag = data['tag']
+    ingredient = data['ingredient']
+    guest = {
+        'email': 'benchmark-guest@example.com',
+        'username': 'benchmark-guest',
+        'first_name': 'Гость',
+        'last_name': 'Замера',
+        'password': 'benchmark-Pa55word',
+    }
+    password = {
+        'current_password': guest['password'],
+        'new_password': guest['password'],
+    }
+    created = {
+        'tags': [tag.pk],
+        'ingredients': [{'id': ingredient.pk, 'amount': 10}],
+        'name': 'Рецепт замера',
+        'text': 'Создан командой benchmark.',
+        'cooking_time': 10,
+        'image': png_base64(),
+    }
+    bulk = {'recipes': [recipe]}
+
+    def created_url(state):
+        return reverse('api:recipes-detail', args=[state['recipe']])
+
+    def save_recipe(response, state):
+        state['recipe'] = response.json()['id']
+        state['images'].append(
+            Recipe.objects.get(pk=state['recipe']).image.name
+        )
+
+    def save_token(response, state):
+        state['token'] = response.json()['auth_token']
+
+    return (
+        Route('users-list', 'get', reverse('api:users-list')),
+        Route('users-detail', 'get',
+              reverse('api:users-detail', args=[author])),
+        Route('users-me', 'get', reverse('api:users-me')),
+        Route('users-subscriptions', 'get',
+              reverse('api:users-subscriptions') + '?recipes_limit=3'),
+        Route('users-subscribe', 'post',
+              reverse('api:users-subscribe', args=[author])),
+        Route('users-subscribe', 'delete',
+              reverse('api:users-subscribe', args=[author])),
+        Route('users-subscribe', 'put',
+              reverse('api:users-subscribe', args=[author])),
+        Route('users-subscribe', 'delete',
+              reverse('api:users-subscribe', args=[author])),
+        Route('tags-list', 'get', reverse('api:tags-list')),
+        Route('tags-detail', 'get',
+              reverse('api:tags-detail', args=[tag.pk])),
+        Route('ingredients-list', 'get', reverse('api:ingredients-list')),
+        Route('ingredients-search', 'get',
+              reverse('api:ingredients-list') + '?name=' + (
+                  ingredient.name[:2]
+              )),
+        Route('ingredients-detail', 'get',
+              reverse('api:ingredients-detail', args=[ingredient.pk])),
+        Route('recipes-list', 'get', reverse('api:recipes-list')),
+        Route('recipes-list-filtered', 'get',
+              reverse('api:recipes-list') + (
+                  f'?tags={tag.slug}&author={author}'
+              )),
+        Route('recipes-list-favorited', 'get',
+              reverse('api:recipes-list') + '?is_favorited=1'),
+        Route('recipes-list-deep', 'get', reverse('api:recipes-list') + (
+            '?page=' + str(max(1, Recipe.objects.count() // 6))
+        )),
+        Route('recipes-detail', 'get',
+              reverse('api:recipes-detail', args=[recipe])),
+        Route('recipes-favorite', 'post',
+              reverse('api:recipes-favorite', args=[recipe])),
+        Route('recipes-favorite', 'delete',
+              reverse('api:recipes-favorite', args=[recipe])),
+        Route('recipes-favorite', 'put',
+              reverse('api:recipes-favorite', args=[recipe])),
+        Route('recipes-favorite', 'delete',
+              reverse('api:recipes-favorite', args=[recipe])),
+        Route('recipes-shopping-cart', 'post',
+              reverse('api:recipes-shopping-cart', args=[recipe])),
+        Route('recipes-shopping-cart', 'delete',
+              reverse('api:recipes-shopping-cart', args=[recipe])),
+        Route('recipes-shopping-cart', 'put',
+              reverse('api:recipes-shopping-cart', args=[recipe])),
+        Route('recipes-shopping-cart', 'delete',
+              reverse('api:recipes-shopping-cart', args=[recipe])),
+        Route('recipes-favorite-bulk', 'post',
+              reverse('api:recipes-favorite-bulk'), bulk),
+        Route('recipes-favorite-bulk', 'delete',
+              reverse('api:recipes-favorite-bulk'), bulk),
+        Route('recipes-shopping-cart-bulk', 'post',
+              reverse('api:recipes-shopping-cart-bulk'), bulk),
+        Route('recipes-shopping-cart-bulk', 'delete',
+              reverse('api:recipes-shopping-cart-bulk'), bulk),
+        Route('recipes-download-shopping-cart', 'get',
+              reverse('api:recipes-download-shopping-cart')),
+        Route('recipes-create', 'post', reverse('api:recipes-list'),
+              created, save=save_recipe),
+        Route('recipes-partial-update', 'patch', created_url,
+              {'name': 'Рецепт замера, правка'}),
+        Route('recipes-destroy', 'delete', created_url),
+        Route('users-create', 'post', reverse('api:users-list'), guest,
+              ANONYMOUS),
+        Route('token-login', 'post', reverse('api:login'), guest,
+              ANONYMOUS, save_token),
+        Route('token-logout', 'post', reverse('api:logout'), None, GUEST),
+        Route('token-login', 'post', reverse('api:login'), guest,
+              ANONYMOUS, save_token),
+        Route('users-set-password', 'post',
+              reverse('api:users-set-password'), password, GUEST),
+        Route('users-delete', 'delete', reverse('api:users-me'),
+              dict(guest, current_password=guest['password']), GUEST),
+    )
+
+
+def remove_images(names):
+    """Удаляет файлы рецептов, созданных замером, вместе с копиями."""
+    get_executor().shutdown(wait=True)
+    for name in names:
+        default_storage.delete(name)
+        for variant in VARIANTS:
+            default_storage.delete(variant_name(name, variant))
+
+
+def slow_client(base_url, url, authorization, delay, stop):
+    """Клиент на медленной сети: строка заголовков раз в delay секунд.
+
+    Пока заголовки не дошли, синхронный воркер держит под такой запрос
+    поток, а ASGI-сервер разбирает их в цикле событий.
+    """
+    address = urlsplit(base_url)
+    lines = [f'GET {url} HTTP/1.1', f'Host: {address.hostname}']
+    if authorization:
+        lines.append(f'Authorization: {authorization}')
+    lines += ['Connection: close', '']
+    while not stop.is_set():
+        with socket.create_connection(
+            (address.hostname, address.port or 80)
+        ) as sock:
+            for line in lines:
+                stop.wait(delay)
+                sock.sendall(line.encode() + b'\r\n')
+            while sock.recv(65536):
+                pass
+
+
+class Command(BaseCommand):
+    """Комманда для замера задержек и числа SQL-запросов API."""
+    help = 'Benchmark API routes and check latency/query budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument(
+            '--budgets',
+            help='JSON-файл с бюджетами, дополняет BENCHMARK_BUDGETS.'
+        )
+        parser.add_argument(
+            '--base-url',
+            help='Адрес запущенного сервера, например http://127.0.0.1:8000.'
+            ' Замеряются только GET-маршруты, SQL не считается.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Число параллельных клиентов для --base-url.'
+        )
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Запросы к --base-url без токена; маршруты, которые '
+            'отвечают ошибкой, пропускаются.'
+        )
+        parser.add_argument(
+            '--slow-clients', type=int, default=0,
+            help='Число медленных клиентов, которые во время замера '
+            'с --base-url скачивают список покупок (без токена - тэги).'
+        )
+
+    def get_budgets(self, path):
+        budgets = dict(settings.BENCHMARK_BUDGETS)
+        if path:
+            with open(path, encoding='utf-8') as file:
+                budgets.update(json.load(file))
+        return budgets
+
+    def handle(self, *args, **options):
+        budgets = self.get_budgets(options['budgets'])
+        data = get_fixtures()
+        token, _ = Token.objects.get_or_create(user=data['viewer'])
+        routes = get_routes(data)
+        if options['base_url']:
+            timings = self.run_http(
+                options['base_url'],
+                None if options['anonymous'] else f'Token {token.key}',
+                routes, options['iterations'], options['concurrency'],
+                options['slow_clients']
+            )
+            self.report(timings, {}, budgets)
+            return
+        client = Client(
+            HTTP_HOST=settings.ALLOWED_HOSTS[0],
+            HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+        timings = {}
+        queries = {}
+        state = {'images': []}
+        try:
+            for iteration in range(options['iterations'] + 1):
+                for route in routes:
+                    key = f'{route.name} {route.method.upper()}'
+                    elapsed, count = self.request(client, route, state)
+                    if iteration:
+                        timings.setdefault(key, []).append(elapsed)
+                        queries[key] = max(queries.get(key, 0), count)
+        finally:
+            remove_images(state['images'])
+        self.report(timings, queries, budgets)
+
+    def request(self, client, route, state):
+        """Время ответа в мс и число SQL-запросов ко всем БД."""
+        url = route.url(state) if callable(route.url) else route.url
+        extra = {}
+        if route.data is not None:
+            extra = {
+                'data': json.dumps(route.data),
+                'content_type': 'application/json',
+            }
+        if route.user == ANONYMOUS:
+            extra['HTTP_AUTHORIZATION'] = ''
+        elif route.user == GUEST:
+            extra['HTTP_AUTHORIZATION'] = f'Token {state["token"]}'
+        with ExitStack() as stack:
+            contexts = [
+                stack.enter_context(CaptureQueriesContext(connection))
+                for connection in connections.all()
+            ]
+            started = time.perf_counter()
+            response = getattr(client, route.method)(url, **extra)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{route.name} {route.method.upper()} {url}: '
+                f'ответ {response.status_code}'
+            )
+        if route.save:
+            route.save(response, state)
+        return elapsed, sum(
+            len(context.captured_queries) for context in contexts
+        )
+
+    def run_http(self, base_url, authorization, routes, iterations,
+                 concurrency, slow_clients):
+        """Параллельные GET-запросы к живому серверу через HTTP."""
+        stop = threading.Event()
+        slow_url = reverse(
+            'api:recipes-download-shopping-cart' if authorization
+            else 'api:tags-list'
+        )
+        for _ in range(slow_clients):
+            threading.Thread(
+                target=slow_client,
+                args=(base_url, slow_url, authorization, 0.5, stop),
+                daemon=True
+            ).start()
+        try:
+            return self.measure_http(
+                base_url, authorization, routes, iterations, concurrency
+            )
+        finally:
+            stop.set()
+
+    def measure_http(self, base_url, authorization, routes, iterations,
+                     concurrency):
+        session = requests.Session()
+        if authorization:
+            session.headers['Authorization'] = authorization
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        def fetch(url):
+            started = time.perf_counter()
+            response = session.get(base_url.rstrip('/') + url)
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code >= 400:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+            return elapsed
+
+        timings = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for route in routes:
+                if route.method != 'get':
+                    continue
+                key = f'{route.name} GET'
+                url = route.url
+                status_code = session.get(
+                    base_url.rstrip('/') + url
+                ).status_code
+                if status_code >= 400 and not authorization:
+                    self.stdout.write(
+                        f'{key:<42}пропущен: ответ {status_code}'
+                    )
+                    continue
+                started = time.perf_counter()
+                values = list(executor.map(
+                    fetch, [url] * iterations * concurrency
+                ))
+                elapsed = time.perf_counter() - started
+                timings[key] = values
+                self.stdout.write(
+                    f'{key:<42}{len(values) / elapsed:>8.1f} запр./с'
+                )
+        return timings
+
+    def report(self, timings, queries, budgets):
+        self.stdout.write(
+            f'{"route":<42}{"p50":>8}{"p95":>8}{"p99":>8}{"sql":>6}'
+        )
+        failures = []
+        for key, values in timings.items():
+            p95 = percentile(values, 95)
+            self.stdout.write(
+                f'{key:<42}{percentile(values, 50):>8.1f}{p95:>8.1f}'
+                f'{percentile(values, 99):>8.1f}{queries.get(key, "-"):>6}'
+            )
+            budget = {
+                **budgets.get('default', {}),
+                **budgets.get(key.split()[0], {})
+            }
+            if queries.get(key, 0) > budget.get('queries', float('inf')):
+                failures.append(
+                    f'{key}: {queries[key]} SQL > {budget["queries"]}'
+                )
+            if p95 > budget.get('p95_ms', float('inf')):
+                failures.append(
+                    f'{key}: p95 {p95:.1f} мс > {budget["p95_ms"]} мс'
+                )
+        if failures:
+            raise CommandError(
+                'Превышены бюджеты:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('Бюджеты соблюдены.'))
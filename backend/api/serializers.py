@@ -1,11 +1,18 @@
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers, validators
-from recipes.models import (FavoriteList, Ingredient, Recipe,
-                            RecipeIngredients, ShoppingCart, Tag)
+from rest_framework.exceptions import NotFound
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
+from recipes.images import variant_urls
+from recipes.membership import get_request_ids
+from recipes.models import Ingredient, Recipe, RecipeIngredients, Tag
+from users.authentication import add_claims
 from users.models import Subscribe, User
 
+from .fields import Base64OrFileImageField
+
 
 class UserCreateSerializer(UserCreateSerializer):
     """Сериализатор для создания модели User."""
@@ -47,11 +54,9 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        if self.context['request'].user.is_authenticated:
-            return Subscribe.objects.filter(
-                user=obj, subscriber=self.context['request'].user
-            ).exists()
-        return False
+        return obj.pk in get_request_ids(
+            self.context['request'], 'subscriptions'
+        )
 
 
 class PasswordSerializer(serializers.Serializer):
@@ -150,9 +155,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         many=True,
         required=True
     )
-    image = Base64ImageField(
-        represent_in_base64=True
-    )
+    image = Base64OrFileImageField()
 
     class Meta:
         model = Recipe
@@ -165,36 +168,65 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
+    def set_ingredients(self, recipe, ingredients, created=False):
+        """Приводит ингредиенты рецепта к переданному списку."""
+        amounts = {}
+        for ingredient in ingredients:
+            amounts[ingredient['id']] = (
+                amounts.get(ingredient['id'], 0) + ingredient['amount']
+            )
+        existing = Ingredient.objects.in_bulk(list(amounts))
+        missing = set(amounts) - set(existing)
+        if missing:
+            raise NotFound(
+                f'Ингредиенты не найдены: {sorted(missing)}.'
+            )
+        current = {} if created else {
+            item.ingredient_id: item
+            for item in recipe.recipeingredients_set.all()
+        }
+        to_update = []
+        for ingredient_id, item in current.items():
+            if ingredient_id in amounts and (
+                item.amount != amounts[ingredient_id]
+            ):
+                item.amount = amounts[ingredient_id]
+                to_update.append(item)
+        to_delete = set(current) - set(amounts)
+        if to_delete:
+            RecipeIngredients.objects.filter(
+                recipe=recipe, ingredient_id__in=to_delete
+            ).delete()
+        if to_update:
+            RecipeIngredients.objects.bulk_update(to_update, ['amount'])
+        RecipeIngredients.objects.bulk_create([
+            RecipeIngredients(
+                recipe=recipe,
+                ingredient=existing[ingredient_id],
+                amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ])
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('recipeingredients_set')
         tags = validated_data.pop('tags')
         recipe = super().create(validated_data)
         recipe.tags.set(tags)
-        for ingredient in ingredients:
-            amount = ingredient.get('amount')
-            RecipeIngredients.objects.create(
-                ingredient=get_object_or_404(
-                    Ingredient, pk=ingredient.get('id')
-                ),
-                amount=amount,
-                recipe=recipe
-            )
+        self.set_ingredients(recipe, ingredients, created=True)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('recipeingredients_set')
-        tags = validated_data.pop('tags')
+        ingredients = validated_data.pop('recipeingredients_set', None)
+        tags = validated_data.pop('tags', None)
         recipe = super().update(instance, validated_data)
-        instance.tags.set = recipe.tags.set(tags)
-        for ingredient in ingredients:
-            amount = ingredient.get('amount')
-            RecipeIngredients.objects.get_or_create(
-                ingredient=get_object_or_404(
-                    Ingredient, pk=ingredient.get('id')
-                ),
-                amount=amount,
-                recipe=recipe
-            )
+        if tags is not None:
+            recipe.tags.set(tags)
+        if ingredients is not None:
+            self.set_ingredients(recipe, ingredients)
         return recipe
 
     def validate_image(self, value):
@@ -202,6 +234,10 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Добавьте картинку в рецепт.")
         return value
 
+    def to_representation(self, instance):
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
+        return RecipeGETSerializer(instance, context=self.context).data
+
 
 class RecipeGETSerializer(serializers.ModelSerializer):
     """Сериализатор для просмотра рецептов."""
@@ -214,6 +250,7 @@ class RecipeGETSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -226,25 +263,32 @@ class RecipeGETSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         )
 
     def get_is_favorited(self, obj):
-        return (
-            self.context['request'].user.is_authenticated
-            and FavoriteList.objects.filter(
-                recipe=obj, user=self.context['request'].user
-            ).exists()
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return obj.pk in get_request_ids(
+            self.context['request'], 'favorites'
         )
 
     def get_is_in_shopping_cart(self, obj):
-        return (
-            self.context['request'].user.is_authenticated
-            and ShoppingCart.objects.filter(
-                recipe=obj, user=self.context['request'].user
-            ).exists()
-        )
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return obj.pk in get_request_ids(self.context['request'], 'cart')
+
+    def get_image_variants(self, obj):
+        request = self.context.get('request')
+        urls = variant_urls(obj.image)
+        if request is None:
+            return urls
+        return {
+            variant: request.build_absolute_uri(url)
+            for variant, url in urls.items()
+        }
 
 
 class FavoriteANDShoppingListSerializer(serializers.ModelSerializer):
@@ -260,6 +304,15 @@ class FavoriteANDShoppingListSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для пакетных действий."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+
 class SubscribesListSerializer(UserSerializer):
     """Сериализатор для вывода списка подписок."""
     recipes = serializers.SerializerMethodField()
@@ -279,16 +332,39 @@ class SubscribesListSerializer(UserSerializer):
         )
 
     def get_recipes(self, obj):
-        if self.context['request'].query_params.get('recipes_limit'):
+        if hasattr(obj, 'recipes'):
+            recipes = obj.recipes
+        elif self.context['request'].query_params.get('recipes_limit'):
             limit = int(self.context['request'].query_params.get(
                 'recipes_limit')
             )
-            recipes = Recipe.objects.filter(author=obj)[:limit]
+            recipes = Recipe.objects.with_related().filter(
+                author=obj
+            )[:limit]
         else:
-            recipes = Recipe.objects.filter(author=obj)
+            recipes = Recipe.objects.with_related().filter(author=obj)
         serializer = RecipeGETSerializer(
             recipes,
             many=True,
             context={'request': self.context['request']}
         )
         return serializer.data
+
+
+class TokenObtainSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """Сериализатор выдачи пары JWT с полями пользователя в claims."""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
+
+class LogoutSerializer(serializers.Serializer):
+    """Сериализатор для отзыва refresh-токена."""
+    refresh = serializers.CharField()
+
+    def validate_refresh(self, value):
+        try:
+            return RefreshToken(value)
+        except TokenError:
+            raise serializers.ValidationError('Недействительный токен.')
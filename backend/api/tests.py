@@ -0,0 +1,174 @@
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.test import TestCase, override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from backend.querycheck import NPlusOneError
+from recipes.models import (FavoriteList, Ingredient, Recipe,
+                            RecipeIngredients, ShoppingCart, Tag)
+from users.models import Subscribe, User
+
+QUERY_CHECK = {'ENABLED': True, 'THRESHOLD': 5, 'RAISE': True}
+
+
+def recipe_authors(request):
+    """Намеренный N+1: автор каждого рецепта читается отдельным запросом."""
+    return JsonResponse({'authors': [
+        recipe.author.username for recipe in Recipe.objects.all()
+    ]})
+
+
+urlpatterns = [
+    path('recipe-authors/', recipe_authors),
+    path('api/', include('api.urls')),
+]
+
+
+class RecipeQueriesTests(TestCase):
+    """Число запросов к БД не зависит от размера страницы.
+
+    Кэш очищается перед каждым замером: для авторизованного пользователя
+    в счёт входят токен и три запроса множеств подписок, избранного
+    и корзины.
+    """
+
+    LIMITS = (1, 6, 20)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='pass12345', first_name='Reader', last_name='Reader'
+        )
+        authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com', password='pass12345',
+                first_name='Author', last_name=str(number)
+            )
+            for number in range(3)
+        ]
+        tags = [
+            Tag.objects.create(
+                name=f'Тэг {number}', color=f'#00000{number}',
+                slug=f'tag{number}'
+            )
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(4)
+        ]
+        for number in range(20):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}', text='Описание', cooking_time=10,
+                image='recipes/images/recipe.png'
+            )
+            recipe.tags.set(tags[:number % len(tags) + 1])
+            RecipeIngredients.objects.bulk_create(
+                RecipeIngredients(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in ingredients[:number % len(ingredients) + 1]
+            )
+            if number % 2:
+                FavoriteList.objects.create(user=cls.reader, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+        Subscribe.objects.create(user=authors[0], subscriber=cls.reader)
+        cls.recipe = recipe
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.authenticated = APIClient()
+        self.authenticated.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def get_counted(self, client, url, number):
+        cache.clear()
+        with self.assertNumQueries(number):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list_anonymous(self):
+        for limit in self.LIMITS:
+            with self.subTest(limit=limit):
+                response = self.get_counted(
+                    self.anonymous, f'/api/recipes/?limit={limit}', 4
+                )
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_list_authenticated(self):
+        for limit in self.LIMITS:
+            with self.subTest(limit=limit):
+                response = self.get_counted(
+                    self.authenticated, f'/api/recipes/?limit={limit}', 8
+                )
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_retrieve_anonymous(self):
+        self.get_counted(
+            self.anonymous, f'/api/recipes/{self.recipe.pk}/', 3
+        )
+
+    def test_retrieve_authenticated(self):
+        self.get_counted(
+            self.authenticated, f'/api/recipes/{self.recipe.pk}/', 7
+        )
+
+
+@override_settings(ROOT_URLCONF='api.tests', QUERY_CHECK=QUERY_CHECK)
+class QueryCheckTests(TestCase):
+    """QueryCheckMiddleware находит N+1 и пропускает представления API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='pass12345', first_name='Author', last_name='Author'
+        )
+        for number in range(6):
+            cls.recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=10, image='recipes/images/recipe.png'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_queries_raise(self):
+        with self.assertRaises(NPlusOneError) as context:
+            APIClient().get('/recipe-authors/')
+        message = str(context.exception)
+        self.assertIn('GET /recipe-authors/: 6 раз', message)
+        self.assertIn('api/tests.py', message)
+
+    def test_repeated_queries_logged(self):
+        with self.settings(QUERY_CHECK=dict(QUERY_CHECK, RAISE=False)):
+            with self.assertLogs('backend.querycheck', 'WARNING'):
+                response = APIClient().get('/recipe-authors/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_threshold(self):
+        with self.settings(QUERY_CHECK=dict(QUERY_CHECK, THRESHOLD=6)):
+            response = APIClient().get('/recipe-authors/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_api_views_pass(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        for url in (
+            '/api/recipes/', f'/api/recipes/{self.recipe.pk}/',
+            '/api/tags/', '/api/ingredients/', '/api/users/',
+            '/api/users/subscriptions/'
+        ):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
+from rest_framework_simplejwt.views import TokenRefreshView
 from recipes.views import IngredientViewSet, RecipeViewSet, TagViewSet
-from users.views import CustomUserViewSet
+from users.views import CustomUserViewSet, TokenObtainView, logout
 
 app_name = 'api'
 
@@ -17,3 +19,12 @@ urlpatterns = [
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.AUTH_MODE == 'jwt':
+    urlpatterns += [
+        path('auth/jwt/create/', TokenObtainView.as_view(),
+             name='jwt-create'),
+        path('auth/jwt/refresh/', TokenRefreshView.as_view(),
+             name='jwt-refresh'),
+        path('auth/jwt/logout/', logout, name='jwt-logout'),
+    ]
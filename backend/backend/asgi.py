@@ -0,0 +1,21 @@
+import os
+
+from asgiref.sync import ThreadSensitiveContext
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+os.environ['SERVER_MODE'] = 'asgi'
+
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    """Каждый HTTP-запрос получает свой поток для синхронного кода.
+
+    Django 3.2 без этого выполняет все синхронные представления и
+    middleware процесса в одном общем потоке, по очереди.
+    """
+    if scope['type'] != 'http':
+        return await django_application(scope, receive, send)
+    async with ThreadSensitiveContext():
+        return await django_application(scope, receive, send)
@@ -0,0 +1,28 @@
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    """Текущая версия набора данных name, хранящаяся в кэше."""
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Увеличивает версию, делая устаревшими все связанные ключи."""
+    key = _version_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(key, version, None)
+        return version
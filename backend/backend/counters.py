@@ -0,0 +1,21 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def change_counter(model, pks, field, delta):
+    """Атомарно меняет счётчик field у объектов с первичными ключами pks."""
+    return model.objects.filter(pk__in=pks).update(
+        **{field: F(field) + delta}
+    )
+
+
+def count_of(model, field):
+    """Подзапрос с количеством строк model, ссылающихся на объект."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count'),
+        output_field=IntegerField()
+    ), 0)
@@ -0,0 +1,154 @@
+"""PostgreSQL-бэкенд с пулом соединений: ENGINE = 'backend.db'."""
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.postgresql import base
+from psycopg2 import extensions, extras
+
+Database = base.Database
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Пул соединений psycopg2 одного процесса.
+
+    Перед выдачей соединение, простаивавшее дольше CHECK_INTERVAL,
+    проверяется запросом SELECT 1; битые соединения закрываются.
+    """
+
+    def __init__(self, size, timeout, check_interval):
+        self.slots = threading.BoundedSemaphore(size)
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def get(self, conn_params):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise Database.OperationalError('Пул соединений исчерпан.')
+        try:
+            while True:
+                with self.lock:
+                    if not self.idle:
+                        break
+                    connection, returned_at = self.idle.pop()
+                if self.is_healthy(connection, returned_at):
+                    return connection
+                self.discard(connection)
+            return Database.connect(**conn_params)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def put(self, connection):
+        try:
+            if self.reset(connection):
+                with self.lock:
+                    self.idle.append((connection, time.monotonic()))
+            else:
+                self.discard(connection)
+        finally:
+            self.slots.release()
+
+    def reset(self, connection):
+        """Откатывает незавершённую транзакцию перед возвратом в пул."""
+        try:
+            if connection.closed:
+                return False
+            status = connection.get_transaction_status()
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            return (
+                connection.get_transaction_status()
+                == extensions.TRANSACTION_STATUS_IDLE
+            )
+        except Database.Error:
+            return False
+
+    def is_healthy(self, connection, returned_at):
+        if connection.closed:
+            return False
+        if time.monotonic() - returned_at < self.check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Database.Error:
+            return False
+        return self.reset(connection)
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Database.Error:
+            pass
+
+    def clear(self):
+        """Закрывает простаивающие соединения."""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            self.discard(connection)
+
+
+def get_pool(conn_params):
+    """Пул текущего процесса.
+
+    После fork воркер gunicorn получает новый пул, а соединения
+    родителя не используются и не закрываются из потомка.
+    """
+    key = (os.getpid(), tuple(sorted(conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            config = settings.DATABASE_POOL
+            _pools[key] = ConnectionPool(
+                config['SIZE'], config['TIMEOUT'], config['CHECK_INTERVAL']
+            )
+        return _pools[key]
+
+
+def clear_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.clear()
+
+
+class DatabaseCreation(base.DatabaseCreation):
+    """Перед удалением тестовой БД закрывает соединения пула с ней.
+
+    Иначе PostgreSQL отказывается удалять базу, к которой подключены.
+    """
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        clear_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Берёт соединения из пула вместо открытия нового на каждый запрос."""
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(conn_params)
+        connection = self.pool.get(conn_params)
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda value: value
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            self.pool.put(self.connection)
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import random
+
+from asgiref.local import Local
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.permissions import SAFE_METHODS
+
+# Local, а не threading.local: в ASGI реплику выбирает middleware
+# в цикле событий, а запросы к БД идут из потока представления.
+_state = Local()
+
+
+def sticky_key(request):
+    """Ключ клиента по заголовку Authorization или сессии, без запросов."""
+    credentials = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    digest = hashlib.sha256(credentials.encode()).hexdigest()
+    return f'replica:sticky:{digest}'
+
+
+def pin_primary():
+    """Дальнейшие чтения текущего запроса идут в основную БД."""
+    _state.replica = None
+
+
+class ReplicaRouter:
+    """Чтения безопасных запросов направляет в реплики, остальное в default.
+
+    Вне запроса (команды, фоновые потоки) всё идёт в основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'replica', None) or 'default'
+
+    def db_for_write(self, model, **hints):
+        pin_primary()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaMiddleware:
+    """Выбирает одну реплику для чтения на время запроса.
+
+    После изменяющего запроса клиент STICKY_SECONDS читает из основной
+    БД, чтобы сразу видеть свои изменения в избранном и корзине. Отметка
+    хранится в общем кэше 'shared', чтобы её видели все воркеры.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        key = sticky_key(request)
+        safe = request.method in SAFE_METHODS
+        self.choose(safe and not (key and caches['shared'].get(key)))
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica = None
+        if not safe and key:
+            caches['shared'].set(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        key = sticky_key(request)
+        safe = request.method in SAFE_METHODS
+        shared = caches['shared']
+        sticky = key and await sync_to_async(
+            shared.get, thread_sensitive=False
+        )(key)
+        self.choose(safe and not sticky)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.replica = None
+        if not safe and key:
+            await sync_to_async(shared.set, thread_sensitive=False)(
+                key, True, settings.REPLICA_STICKY_SECONDS
+            )
+        return response
+
+    def choose(self, replica):
+        _state.replica = (
+            random.choice(settings.DATABASE_REPLICAS) if replica else None
+        )
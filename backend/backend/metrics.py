@@ -0,0 +1,143 @@
+import asyncio
+import ipaddress
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+from .queries import observe as observe_queries
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+LABELS = ('route', 'method')
+
+REQUESTS = Counter(
+    'foodgram_http_requests', 'Число HTTP-запросов.', LABELS
+)
+LATENCY = Histogram(
+    'foodgram_http_request_duration_seconds', 'Время ответа.', LABELS,
+    buckets=LATENCY_BUCKETS
+)
+QUERIES = Histogram(
+    'foodgram_db_queries_per_request', 'Запросов к БД на HTTP-запрос.',
+    LABELS, buckets=QUERY_BUCKETS
+)
+SQL_TIME = Counter(
+    'foodgram_db_query_duration_seconds', 'Суммарное время запросов к БД.',
+    LABELS
+)
+
+
+def observe(route, method, latency, queries, sql_time):
+    REQUESTS.labels(route, method).inc()
+    LATENCY.labels(route, method).observe(latency)
+    QUERIES.labels(route, method).observe(queries)
+    SQL_TIME.labels(route, method).inc(sql_time)
+
+
+def render():
+    """Метрики всех воркеров gunicorn.
+
+    Если задан PROMETHEUS_MULTIPROC_DIR, каждый процесс пишет значения
+    в свой файл в этом каталоге, и здесь они суммируются.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+class QueryCounter:
+    """Обёртка execute_wrapper, считающая запросы и время в БД."""
+
+    def __init__(self):
+        self.queries = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.time += time.perf_counter() - started
+
+    def wrap(self):
+        return observe_queries(self)
+
+
+class MetricsMiddleware:
+    """Считает запросы, задержку и SQL по каждому маршруту.
+
+    Работает и в WSGI, и в ASGI без переходов между потоками.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with counter.wrap():
+            response = self.get_response(request)
+        return self.finish(request, response, counter, started)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with counter.wrap():
+            response = await self.get_response(request)
+        return self.finish(request, response, counter, started)
+
+    def finish(self, request, response, counter, started):
+        def record():
+            match = request.resolver_match
+            observe(
+                match.view_name if match else 'unresolved',
+                request.method,
+                time.perf_counter() - started,
+                counter.queries,
+                counter.time
+            )
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, counter, record
+            )
+        else:
+            record()
+        return response
+
+    def stream(self, content, counter, record):
+        with counter.wrap():
+            yield from content
+        record()
+
+
+def is_internal(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def metrics(request):
+    """Метрики в текстовом формате Prometheus, только для внутренних IP."""
+    if not is_internal(request.META.get('REMOTE_ADDR', '')):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE_LATEST)
@@ -1,6 +1,82 @@
-from rest_framework.pagination import PageNumberPagination
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class FoodgramPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class FoodgramCursorPagination(CursorPagination):
+    """Пагинация по ключу (pub_date, id) без OFFSET и COUNT(*).
+
+    CursorPagination из DRF сравнивает только первое поле сортировки
+    и пропускает рецепты с той же датой через OFFSET. Здесь позиция
+    курсора - пара (pub_date, id), она уникальна, и граница страницы
+    задаётся условием по обоим полям, которое покрывает индекс
+    recipe_pub_date_id_idx.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = self.cursor and self.cursor.position
+
+        if reverse:
+            queryset = queryset.order_by('pub_date', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            pub_date, pk = self.parse_position(current_position)
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+                )
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def parse_position(self, position):
+        pub_date, _, pk = position.rpartition('|')
+        try:
+            pub_date, pk = parse_datetime(pub_date), int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def _get_position_from_instance(self, instance, ordering):
+        return f'{instance.pub_date.isoformat()}|{instance.pk}'
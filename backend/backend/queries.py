@@ -0,0 +1,45 @@
+"""Наблюдение за запросами к БД в рамках одного HTTP-запроса.
+
+Обёртка execute_wrapper ставится на каждое соединение один раз, а
+наблюдатели текущего запроса хранятся в ContextVar. В режиме ASGI
+представление выполняется в другом потоке, чем middleware, и
+connection.execute_wrapper в потоке middleware запросов не увидел бы;
+контекст же sync_to_async передаёт в поток вместе с наблюдателями.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_observers = contextvars.ContextVar('query_observers', default=())
+
+
+def execute_observed(execute, sql, params, many, context):
+    for observer in reversed(_observers.get()):
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    if execute_observed not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_observed)
+
+
+@contextmanager
+def observe(observer):
+    """Передаёт observer запросы текущего контекста.
+
+    observer вызывается как обёртка execute_wrapper.
+    """
+    token = _observers.set(_observers.get() + (observer,))
+    try:
+        yield
+    finally:
+        _observers.reset(token)
+
+
+connection_created.connect(install)
+for connection in connections.all():
+    install(connection)
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import re
+import traceback
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .queries import observe
+
+logger = logging.getLogger(__name__)
+
+LITERALS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+class NPlusOneError(AssertionError):
+    """Повторяющиеся однотипные запросы в рамках одного запроса."""
+
+
+def fingerprint(sql):
+    """Форма запроса без литералов и длины списков IN."""
+    for pattern, replacement in LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def project_frame():
+    """Последний кадр стека из кода проекта, а не из библиотек."""
+    internal = os.path.dirname(os.path.abspath(__file__))
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if (
+            filename.startswith(settings.BASE_DIR)
+            and 'site-packages' not in filename
+            and not filename.startswith(internal)
+        ):
+            return f'{frame.filename}:{frame.lineno} in {frame.name}'
+    return 'неизвестно'
+
+
+class QueryRecorder:
+    """Обёртка execute_wrapper, считающая формы запросов."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.frames = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        key = fingerprint(sql)
+        self.counts[key] += 1
+        if self.counts[key] == 2:
+            self.frames[key] = project_frame()
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        return [
+            (key, count, self.frames.get(key))
+            for key, count in self.counts.items() if count > threshold
+        ]
+
+
+class QueryCheckMiddleware:
+    """Находит N+1: один и тот же запрос больше THRESHOLD раз.
+
+    Включается через settings.QUERY_CHECK; при RAISE бросает
+    NPlusOneError, чтобы тест упал.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = settings.QUERY_CHECK
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = config['THRESHOLD']
+        self.raise_error = config['RAISE']
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with observe(recorder):
+            response = self.get_response(request)
+        self.check(request, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        with observe(recorder):
+            response = await self.get_response(request)
+        self.check(request, recorder)
+        return response
+
+    def check(self, request, recorder):
+        repeated = recorder.repeated(self.threshold)
+        if repeated:
+            message = '\n'.join(
+                f'{request.method} {request.path}: {count} раз из {frame}\n'
+                f'    {key}'
+                for key, count, frame in repeated
+            )
+            if self.raise_error:
+                raise NPlusOneError(message)
+            logger.warning('Возможный N+1:\n%s', message)
@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 
 from dotenv import load_dotenv
 
@@ -28,12 +29,16 @@ INSTALLED_APPS = [
     'django_filters',
     'rest_framework.authtoken',
     'djoser',
+    'rest_framework_simplejwt.token_blacklist',
     'api',
     'recipes',
     'users',
 ]
 
 MIDDLEWARE = [
+    'backend.metrics.MetricsMiddleware',
+    'backend.querycheck.QueryCheckMiddleware',
+    'backend.db_router.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +68,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# 'asgi' выставляет backend/asgi.py: справочники и список рецептов
+# становятся асинхронными представлениями.
+SERVER_MODE = os.getenv('SERVER_MODE', default='wsgi')
+
 
 DATABASES = {
     'default': {
@@ -72,8 +81,74 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default=None),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default=None),
         'HOST': os.getenv('DB_HOST', default=None),
-        'PORT': os.getenv('DB_PORT', default=None)
+        'PORT': os.getenv('DB_PORT', default=None),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=0))
+    }
+}
+
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(','))
+):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['backend.db_router.ReplicaRouter']
+
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=10))
+
+DATABASE_POOL = {
+    'SIZE': int(os.getenv('DB_POOL_SIZE', default=10)),
+    'TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', default=5)),
+    'CHECK_INTERVAL': int(os.getenv('DB_POOL_CHECK_INTERVAL', default=30)),
+}
+
+REDIS_URL = os.getenv('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'foodgram',
+        },
+        'shared': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'foodgram:shared',
+            'TIMEOUT': None,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'foodgram',
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'foodgram-shared',
+            'TIMEOUT': None,
+            'OPTIONS': {'MAX_ENTRIES': 10 ** 7},
+        },
+    }
+
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60
+
+BENCHMARK_BUDGETS = {
+    'default': {'queries': 6, 'p95_ms': 500},
+    'recipes-list-filtered': {'queries': 8},
+    'recipes-favorite-bulk': {'queries': 8},
+    'recipes-shopping-cart-bulk': {'queries': 8},
+    'recipes-create': {'queries': 15},
+    'recipes-partial-update': {'queries': 8},
+    'recipes-destroy': {'queries': 11},
+    'users-delete': {'queries': 17},
 }
 
 
@@ -103,6 +178,8 @@ USE_L10N = True
 
 USE_TZ = True
 
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
@@ -110,20 +187,57 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', default=5 * 1024 * 1024)
+)
+
+AUTH_MODE = os.getenv('AUTH_MODE', default='token')
+
+AUTHENTICATION_CLASSES = ['rest_framework.authentication.TokenAuthentication']
+if AUTH_MODE == 'jwt':
+    AUTHENTICATION_CLASSES.insert(
+        0, 'users.authentication.StatelessJWTAuthentication'
+    )
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-    ],
+    'DEFAULT_AUTHENTICATION_CLASSES': AUTHENTICATION_CLASSES,
     'DEFAULT_PAGINATION_CLASS': 'backend.pagination.FoodgramPagination',
     'PAGE_SIZE': 6,
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
 }
 
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.getenv('JWT_ACCESS_MINUTES', default=15))
+    ),
+    'REFRESH_TOKEN_LIFETIME': timedelta(
+        days=int(os.getenv('JWT_REFRESH_DAYS', default=7))
+    ),
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
+    'AUTH_HEADER_TYPES': ('Bearer',),
+}
+
 AUTH_USER_MODEL = 'users.User'
 
+INGREDIENT_SEARCH_LIMIT = 20
+
+QUERY_CHECK = {
+    'ENABLED': os.getenv('QUERY_CHECK', default='False') == 'True',
+    'THRESHOLD': int(os.getenv('QUERY_CHECK_THRESHOLD', default=5)),
+    'RAISE': os.getenv('QUERY_CHECK_RAISE', default='False') == 'True',
+}
+
+METRICS_ALLOWED_NETWORKS = os.getenv(
+    'METRICS_ALLOWED_NETWORKS',
+    default='127.0.0.0/8,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16'
+).split(',')
+
 DJOSER = {
     'PERMISSIONS': {
         'user': ('rest_framework.permissions.IsAuthenticated',),
@@ -0,0 +1,40 @@
+import os
+
+# SERVER_MODE=asgi запускает backend.asgi в воркерах uvicorn.
+SERVER_MODE = os.getenv('SERVER_MODE', default='wsgi')
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'backend.asgi:application'
+    default_worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'backend.wsgi:application'
+    default_worker_class = 'gthread'
+
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+worker_class = os.getenv(
+    'GUNICORN_WORKER_CLASS', default=default_worker_class
+)
+workers = int(os.getenv('GUNICORN_WORKERS', default=1))
+threads = int(os.getenv('GUNICORN_THREADS', default=4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=1000))
+max_requests_jitter = max_requests // 10
+
+if workers > 1 and not os.getenv('REDIS_URL'):
+    raise RuntimeError(
+        'Несколько воркеров требуют общий кэш: задайте REDIS_URL.'
+    )
+
+
+def on_starting(server):
+    """Удаляет файлы метрик прошлого запуска."""
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -20,7 +20,10 @@ class IngredientAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'author', 'name',)
+    list_display = (
+        'id', 'author', 'name', 'favorites_count', 'in_carts_count'
+    )
+    readonly_fields = ('favorites_count', 'in_carts_count')
     search_fields = ('name', 'author')
     list_filter = ('name', 'author')
 
@@ -1,20 +1,19 @@
-from rest_framework import filters
-
 from .models import Recipe, Tag
+from .search import search_recipes
 import django_filters as filter
 
 
-class IngredientSearchFilter(filters.SearchFilter):
-    search_param = 'name'
-
-
 class RecipesFilter(filter.FilterSet):
     tags = filter.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all()
     )
+    search = filter.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags']
+        fields = ['author', 'tags', 'search']
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
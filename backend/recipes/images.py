@@ -0,0 +1,96 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+from backend.cache import bump_version
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumbnail': ((320, 320), 'JPEG', 'jpg'),
+    'medium': ((960, 960), 'JPEG', 'jpg'),
+    'webp': ((960, 960), 'WEBP', 'webp'),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Пул воркеров создаётся лениво, уже в процессе-воркере."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS,
+                    thread_name_prefix='recipe-images'
+                )
+    return _executor
+
+
+def variant_name(name, variant):
+    directory, filename = os.path.split(os.path.splitext(name)[0])
+    extension = VARIANTS[variant][2]
+    return os.path.join(
+        directory, 'variants', f'{filename}_{variant}.{extension}'
+    )
+
+
+def render_variants(name):
+    """Создаёт недостающие уменьшенные копии изображения рецепта.
+
+    Если все копии уже есть, исходник не открывается и не декодируется.
+    """
+    try:
+        missing = [
+            variant for variant in VARIANTS
+            if not default_storage.exists(variant_name(name, variant))
+        ]
+        if not missing:
+            return
+        with default_storage.open(name) as file:
+            image = Image.open(file)
+            image.load()
+        for variant in missing:
+            size, image_format, _ = VARIANTS[variant]
+            resized = image.copy()
+            resized.thumbnail(size)
+            if image_format == 'JPEG' and resized.mode != 'RGB':
+                resized = resized.convert('RGB')
+            buffer = BytesIO()
+            resized.save(buffer, image_format, quality=85)
+            default_storage.save(
+                variant_name(name, variant), ContentFile(buffer.getvalue())
+            )
+        bump_version('recipes')
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+
+
+def schedule_variants(name):
+    """Ставит обработку в очередь после фиксации транзакции."""
+    transaction.on_commit(
+        lambda: get_executor().submit(render_variants, name)
+    )
+
+
+def variant_urls(image):
+    """Ссылки на готовые копии; пока их нет, отдаётся оригинал."""
+    if not image:
+        return {}
+    last = variant_name(image.name, list(VARIANTS)[-1])
+    if not default_storage.exists(last):
+        return {variant: image.url for variant in VARIANTS}
+    return {
+        variant: default_storage.url(variant_name(image.name, variant))
+        for variant in VARIANTS
+    }
@@ -0,0 +1,80 @@
+import json
+import threading
+from bisect import bisect_left
+
+from backend.cache import get_version
+
+from .models import Ingredient
+
+
+class IngredientIndex:
+    """Отсортированный индекс ингредиентов для поиска по префиксу.
+
+    Строится при первом обращении и перестраивается, когда меняется
+    версия справочника ингредиентов, в том числе из другого процесса.
+    Читает основную БД, чтобы не закрепить под новой версией данные
+    отстающей реплики.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = None
+
+    def _load(self, build=True):
+        version = get_version('ingredients')
+        if self._version != version:
+            if not build:
+                return None
+            with self._lock:
+                if self._version != version:
+                    self._entries = self._build()
+                    self._version = version
+        return self._entries
+
+    def _build(self):
+        rows = sorted(
+            Ingredient.objects.using('default').values_list(
+                'id', 'name', 'measurement_unit'
+            ).order_by(),
+            key=lambda row: (row[1].lower(), row[0])
+        )
+        keys = [name.lower() for _, name, _ in rows]
+        rendered = [
+            json.dumps(
+                {'id': pk, 'name': name, 'measurement_unit': unit},
+                ensure_ascii=False,
+                separators=(',', ':')
+            ).encode()
+            for pk, name, unit in rows
+        ]
+        return keys, rendered
+
+    def all(self):
+        _, rendered = self._load()
+        return b'[' + b','.join(rendered) + b']'
+
+    def search(self, query, limit, build=True):
+        """Сначала совпадения по префиксу, затем по подстроке.
+
+        С build=False не обращается к БД и возвращает None, если индекс
+        не построен для текущей версии.
+        """
+        entries = self._load(build)
+        if entries is None:
+            return None
+        keys, rendered = entries
+        query = query.lower()
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\U0010ffff', start)
+        found = rendered[start:min(end, start + limit)]
+        if len(found) < limit:
+            for index, key in enumerate(keys):
+                if query in key and not start <= index < end:
+                    found.append(rendered[index])
+                    if len(found) == limit:
+                        break
+        return b'[' + b','.join(found) + b']'
+
+
+ingredient_index = IngredientIndex()
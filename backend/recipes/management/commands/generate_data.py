@@ -0,0 +1,164 @@
+import random
+import time
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+from recipes.models import (FavoriteList, Ingredient, Recipe,
+                            RecipeIngredients, ShoppingCart, Tag)
+from recipes.search import update_search_vector
+from users.models import Subscribe, User
+from backend.cache import bump_version
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+PASSWORD = 'foodgram-bench'
+
+
+def pareto_choice(items, alpha=1.2):
+    """Выбор с тяжёлым хвостом: немногие элементы очень популярны."""
+    index = int(random.paretovariate(alpha)) - 1
+    return items[min(index, len(items) - 1)]
+
+
+def sample_size(mean, limit):
+    return min(int(random.expovariate(1 / mean)) + 1, limit)
+
+
+class Command(BaseCommand):
+    """Комманда для генерации тестовых данных поверх ингредиентов."""
+    help = 'Generate synthetic users, recipes, subscriptions and carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        if not ingredient_ids:
+            raise CommandError('Сначала загрузите ингредиенты: load_data.')
+        started = time.perf_counter()
+        with transaction.atomic():
+            tag_ids = self.get_tags()
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                options['recipes'], user_ids, tag_ids, ingredient_ids
+            )
+            self.create_relations(user_ids, recipe_ids)
+            update_search_vector(Recipe.objects.filter(pk__in=recipe_ids))
+            call_command('recount', stdout=self.stdout)
+        bump_version('tags')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, рецептов: '
+            f'{len(recipe_ids)} за {time.perf_counter() - started:.1f} с. '
+            f'Пароль пользователей: {PASSWORD}'
+        ))
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in TAGS
+            )
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        prefix = f'bench{int(time.time())}'
+        User.objects.bulk_create((
+            User(
+                username=f'{prefix}_{number}',
+                email=f'{prefix}_{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password
+            )
+            for number in range(count)
+        ))
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).values_list('pk', flat=True))
+
+    def create_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), '#E26C2D').save(buffer, 'JPEG')
+        return default_storage.save(
+            'media/recipes/images/benchmark.jpg',
+            ContentFile(buffer.getvalue())
+        )
+
+    def create_recipes(self, count, user_ids, tag_ids, ingredient_ids):
+        image = self.create_image()
+        authors = random.sample(user_ids, len(user_ids))
+        recipes = Recipe.objects.bulk_create((
+            Recipe(
+                author_id=pareto_choice(authors),
+                name=f'Рецепт {number}',
+                text='Нарезать, смешать и запечь. ' * sample_size(5, 40),
+                cooking_time=random.randint(5, 180),
+                image=image
+            )
+            for number in range(count)
+        ))
+        recipe_ids = [recipe.pk for recipe in recipes]
+        if None in recipe_ids:
+            recipe_ids = list(Recipe.objects.filter(
+                image=image
+            ).values_list('pk', flat=True))
+        through = Recipe.tags.through
+        tags = []
+        ingredients = []
+        for recipe_id in recipe_ids:
+            for tag_id in random.sample(
+                tag_ids, sample_size(1, len(tag_ids))
+            ):
+                tags.append(through(recipe_id=recipe_id, tag_id=tag_id))
+            for ingredient_id in random.sample(
+                ingredient_ids, sample_size(6, 20)
+            ):
+                ingredients.append(RecipeIngredients(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=random.randint(1, 500)
+                ))
+        through.objects.bulk_create(tags)
+        RecipeIngredients.objects.bulk_create(ingredients)
+        return recipe_ids
+
+    def create_relations(self, user_ids, recipe_ids):
+        popular = random.sample(recipe_ids, len(recipe_ids))
+        authors = list(set(Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).values_list('author_id', flat=True)))
+        favorites, carts, subscriptions = set(), set(), set()
+        for user_id in user_ids:
+            for _ in range(sample_size(10, len(recipe_ids))):
+                favorites.add((user_id, pareto_choice(popular)))
+            for _ in range(sample_size(3, len(recipe_ids))):
+                carts.add((user_id, pareto_choice(popular)))
+            for _ in range(sample_size(4, len(authors))):
+                author_id = pareto_choice(authors)
+                if author_id != user_id:
+                    subscriptions.add((author_id, user_id))
+        FavoriteList.objects.bulk_create((
+            FavoriteList(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in favorites
+        ))
+        ShoppingCart.objects.bulk_create((
+            ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in carts
+        ))
+        Subscribe.objects.bulk_create((
+            Subscribe(user_id=author_id, subscriber_id=user_id)
+            for author_id, user_id in subscriptions
+        ))
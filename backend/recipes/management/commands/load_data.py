@@ -1,18 +1,132 @@
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
 import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import Ingredient
+
+from backend.cache import bump_version
+
+DEFAULT_PATH = 'recipes/data/ingredients.csv'
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8') as file:
+        for row in csv.reader(file):
+            if row:
+                yield row[0].strip(), row[1].strip()
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        for item in json.load(file):
+            yield item['name'].strip(), item['measurement_unit'].strip()
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
 
 
 class Command(BaseCommand):
-    """Комманда для загрузки ингредиентов из csv."""
+    """Комманда для загрузки ингредиентов из csv или json."""
     help = 'Load ingredients data'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Путь к ingredients.csv или ingredients.json.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном INSERT.'
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загрузка через COPY (только PostgreSQL).'
+        )
+
     def handle(self, *args, **options):
-        with open('recipes/data/ingredients.csv') as file:
-            file_reader = csv.reader(file)
-            for row in file_reader:
-                name, measurement_unit = row
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=measurement_unit
+        path = options['path']
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in READERS:
+            raise CommandError(f'Неподдерживаемый формат файла: {path}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0.')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy доступен только в PostgreSQL.')
+        rows = READERS[extension](path)
+        started = time.perf_counter()
+        with transaction.atomic():
+            if options['copy']:
+                total, created = self.load_copy(rows)
+            else:
+                total, created = self.load_bulk(rows, options['batch_size'])
+        if created:
+            bump_version('ingredients')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {total}, добавлено: {created} '
+            f'за {elapsed:.2f} с ({total / max(elapsed, 1e-6):.0f} строк/с).'
+        ))
+
+    def load_bulk(self, rows, batch_size):
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        total = created = 0
+        for batch in batches(rows, batch_size):
+            total += len(batch)
+            new = [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in dict.fromkeys(batch)
+                if (name, measurement_unit) not in existing
+            ]
+            if new:
+                Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+                existing.update(
+                    (item.name, item.measurement_unit) for item in new
                 )
+                created += len(new)
+        return total, created
+
+    def load_copy(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        total = 0
+        for row in rows:
+            writer.writerow(row)
+            total += 1
+        buffer.seek(0)
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredients_import '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+            cursor.cursor.copy_expert(
+                'COPY ingredients_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredients_import '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            created = cursor.rowcount
+        return total, created
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from recipes.images import render_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Комманда для создания копий изображений уже загруженных рецептов."""
+    help = 'Render image variants for existing recipes'
+
+    def handle(self, *args, **options):
+        names = Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        )
+        for name in names.iterator():
+            render_variants(name)
+        self.stdout.write(self.style.SUCCESS('Готово.'))
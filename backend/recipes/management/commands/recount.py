@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import FavoriteList, Recipe, ShoppingCart
+from users.models import Subscribe, User
+from backend.counters import count_of
+
+
+class Command(BaseCommand):
+    """Комманда для пересчёта денормализованных счётчиков."""
+    help = 'Recount favorites, cart, recipes and subscribers counters'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.update(
+            favorites_count=count_of(FavoriteList, 'recipe'),
+            in_carts_count=count_of(ShoppingCart, 'recipe')
+        )
+        users = User.objects.update(
+            recipes_count=count_of(Recipe, 'author'),
+            subscribers_count=count_of(Subscribe, 'user')
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}.'
+        ))
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from users.models import Subscribe
+
+from .models import FavoriteList, ShoppingCart
+
+KINDS = {
+    'favorites': (FavoriteList, 'user_id', 'recipe_id'),
+    'cart': (ShoppingCart, 'user_id', 'recipe_id'),
+    'subscriptions': (Subscribe, 'subscriber_id', 'user_id'),
+}
+
+
+def _key(kind, user_id):
+    return f'membership:{kind}:{user_id}'
+
+
+def get_ids(kind, user_id):
+    """Множество id рецептов/авторов пользователя из кэша или основной БД."""
+    key = _key(kind, user_id)
+    ids = cache.get(key)
+    if ids is None:
+        model, owner, target = KINDS[kind]
+        ids = set(model.objects.using('default').filter(
+            **{owner: user_id}
+        ).values_list(target, flat=True))
+        cache.set(key, ids, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return ids
+
+
+def get_request_ids(request, kind):
+    """То же, что get_ids, но не чаще одного раза за запрос."""
+    if not request.user.is_authenticated:
+        return set()
+    memo = request.__dict__.setdefault('_membership', {})
+    if kind not in memo:
+        memo[kind] = get_ids(kind, request.user.pk)
+    return memo[kind]
+
+
+def invalidate_ids(kind, user_id):
+    """Сбрасывает кэш после фиксации; следующее чтение возьмёт данные из БД.
+
+    Удаление атомарно, поэтому параллельные изменения не теряются.
+    """
+    key = _key(kind, user_id)
+    transaction.on_commit(lambda: cache.delete(key))
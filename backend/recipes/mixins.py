@@ -0,0 +1,208 @@
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from backend.cache import get_version
+from backend.db_router import pin_primary
+
+
+def query_key(request, params):
+    """Строка ключа кэша из значений params, в которых есть значения.
+
+    Прочие параметры не попадают в ключ, поэтому мусорные аргументы
+    не плодят новых записей кэша.
+    """
+    return urlencode(sorted(
+        (name, value)
+        for name in params
+        for value in request.GET.getlist(name) if value
+    ))
+
+
+def async_view(view, cached_content):
+    """Асинхронное представление поверх view для режима ASGI.
+
+    cached_content отдаёт готовый ответ из кэша или None и выполняется
+    в общем пуле потоков. Промах уходит в view в потоке запроса, где
+    Django открывает и закрывает соединения с БД.
+    """
+    cached_content = sync_to_async(cached_content, thread_sensitive=False)
+    view_async = sync_to_async(view)
+
+    async def wrapper(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            response = await cached_content(request, *args, **kwargs)
+            if response is not None:
+                return response
+        return await view_async(request, *args, **kwargs)
+
+    return wraps(view)(wrapper)
+
+
+class AsyncCacheMixin:
+    """В режиме ASGI отдаёт попадания в кэш асинхронно, без DRF.
+
+    Подклассы реализуют классовый метод cached_content, который
+    не обращается к БД.
+    """
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if settings.SERVER_MODE != 'asgi':
+            return view
+        return async_view(view, cls.cached_content)
+
+
+class CatalogueCacheMixin(AsyncCacheMixin):
+    """Кэширует ответы справочника под номером его версии.
+
+    Версия увеличивается сигналами при изменении модели, поэтому старые
+    ключи просто перестают использоваться. ETag строится из версии, и
+    повторный запрос с If-None-Match получает 304 без обращения к БД.
+    Промах кэша читает основную БД: отстающая реплика сохранила бы
+    старые данные под новой версией.
+    """
+    catalogue_name = None
+    catalogue_params = ()
+    catalogue_timeout = 60 * 60 * 24
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    @classmethod
+    def catalogue_etag(cls):
+        """ETag и версия справочника."""
+        version = get_version(cls.catalogue_name)
+        return f'"{cls.catalogue_name}-{version}"', version
+
+    @classmethod
+    def catalogue_key(cls, request, version):
+        return 'catalogue:{}:{}:{}?{}'.format(
+            cls.catalogue_name,
+            version,
+            request.path,
+            query_key(request, cls.catalogue_params)
+        )
+
+    @staticmethod
+    def not_modified(request, etag):
+        """Ответ 304, если у клиента актуальная версия, иначе None."""
+        if etag not in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            return None
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    @staticmethod
+    def json_response(content, etag):
+        response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+    @classmethod
+    def cached_content(cls, request, *args, **kwargs):
+        """Ответ 304 или ответ из кэша; None при промахе."""
+        etag, version = cls.catalogue_etag()
+        response = cls.not_modified(request, etag)
+        if response is not None:
+            return response
+        content = cache.get(cls.catalogue_key(request, version))
+        if content is None:
+            return None
+        return cls.json_response(content, etag)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        response = self.cached_content(request, *args, **kwargs)
+        if response is not None:
+            return response
+        etag, version = self.catalogue_etag()
+        pin_primary()
+        response = handler(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        if isinstance(response, Response):
+            content = JSONRenderer().render(response.data)
+        else:
+            content = response.content
+        cache.set(
+            self.catalogue_key(request, version), content,
+            self.catalogue_timeout
+        )
+        return self.json_response(content, etag)
+
+
+class AnonymousCacheMixin(AsyncCacheMixin):
+    """Кэширует list/retrieve для анонимных пользователей.
+
+    Для них флаги избранного и корзины всегда ложны, поэтому ответ
+    зависит только от адреса. Ключ строится из поколения 'recipes',
+    которое сигналы увеличивают при изменении рецептов, тэгов и авторов.
+    Как и в CatalogueCacheMixin, промах кэша читает основную БД.
+    """
+    anonymous_cache_params = (
+        'page', 'limit', 'tags', 'author', 'cursor', 'pagination', 'search',
+        'is_favorited', 'is_in_shopping_cart',
+    )
+    anonymous_cache_timeout = 60 * 10
+
+    def list(self, request, *args, **kwargs):
+        return self.anonymous_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.anonymous_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    @classmethod
+    def anonymous_cache_key(cls, request):
+        return 'anonymous:{}:{}?{}'.format(
+            get_version('recipes'),
+            request.build_absolute_uri(request.path),
+            query_key(request, cls.anonymous_cache_params)
+        )
+
+    @classmethod
+    def cached_content(cls, request, *args, **kwargs):
+        """Ответ из кэша для запроса без учётных данных, который
+        DRF отдал бы в JSON; иначе None."""
+        accept = request.META.get('HTTP_ACCEPT', '*/*')
+        if (
+            'HTTP_AUTHORIZATION' in request.META
+            or 'format' in request.GET
+            or 'text/html' in accept
+            or not ('*/*' in accept or 'application/json' in accept)
+        ):
+            return None
+        content = cache.get(cls.anonymous_cache_key(request))
+        if content is None:
+            return None
+        return HttpResponse(content, content_type='application/json')
+
+    def anonymous_response(self, handler, request, *args, **kwargs):
+        if (
+            request.user.is_authenticated
+            or request.accepted_renderer.format != 'json'
+        ):
+            return handler(request, *args, **kwargs)
+        key = self.anonymous_cache_key(request)
+        content = cache.get(key)
+        if content is None:
+            pin_primary()
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = JSONRenderer().render(response.data)
+            cache.set(key, content, self.anonymous_cache_timeout)
+        return HttpResponse(content, content_type='application/json')
@@ -0,0 +1,45 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, When
+
+SEARCH_CONFIG = 'russian'
+
+
+def recipe_search_vector():
+    """Название весит больше описания."""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def is_postgresql(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def update_search_vector(queryset):
+    if is_postgresql(queryset):
+        queryset.update(search_vector=recipe_search_vector())
+
+
+def search_recipes(queryset, value):
+    """Полнотекстовый поиск с ранжированием.
+
+    Вне PostgreSQL (локальная разработка на SQLite) используется
+    icontains, а совпадения в названии ставятся выше совпадений в тексте.
+    """
+    if is_postgresql(queryset):
+        query = SearchQuery(value, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date')
+    return queryset.filter(
+        Q(name__icontains=value) | Q(text__icontains=value)
+    ).annotate(
+        rank=Case(
+            When(name__icontains=value, then=1),
+            default=0,
+            output_field=IntegerField()
+        )
+    ).order_by('-rank', '-pub_date')
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from backend.cache import bump_version
+from backend.counters import change_counter
+from users.models import User
+
+from .images import schedule_variants
+from .membership import invalidate_ids
+from .models import (FavoriteList, Ingredient, Recipe, RecipeIngredients,
+                     ShoppingCart, Tag)
+from .search import update_search_vector
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version('ingredients'))
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version('tags'))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=RecipeIngredients)
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=User)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_version(sender, **kwargs):
+    if (
+        kwargs.get('update_fields') == {'last_login'}
+        or kwargs.get('action', '').startswith('pre_')
+    ):
+        return
+    transaction.on_commit(lambda: bump_version('recipes'))
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_search_vector(sender, instance, **kwargs):
+    update_search_vector(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, **kwargs):
+    if instance.image:
+        schedule_variants(instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def increase_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, [instance.author_id], 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(sender, instance, **kwargs):
+    change_counter(User, [instance.author_id], 'recipes_count', -1)
+
+
+@receiver(post_save, sender=FavoriteList)
+def increase_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, [instance.recipe_id], 'favorites_count', 1)
+        invalidate_ids('favorites', instance.user_id)
+
+
+@receiver(post_delete, sender=FavoriteList)
+def decrease_favorites_count(sender, instance, **kwargs):
+    change_counter(Recipe, [instance.recipe_id], 'favorites_count', -1)
+    invalidate_ids('favorites', instance.user_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def increase_in_carts_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, [instance.recipe_id], 'in_carts_count', 1)
+        invalidate_ids('cart', instance.user_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def decrease_in_carts_count(sender, instance, **kwargs):
+    change_counter(Recipe, [instance.recipe_id], 'in_carts_count', -1)
+    invalidate_ids('cart', instance.user_id)
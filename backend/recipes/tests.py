@@ -0,0 +1,417 @@
+import asyncio
+import json
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import (AsyncRequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import FavoriteList, Ingredient, Recipe, ShoppingCart, Tag
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+from backend.cache import bump_version, get_version
+from users.models import User
+
+
+class ToggleTests(TestCase):
+    """Избранное и корзина: POST, PUT и DELETE, повторы и чужие id.
+
+    Под PostgreSQL проверяется ветка INSERT/DELETE ... RETURNING,
+    под другими СУБД - запасная ветка через ORM и сигналы.
+    """
+
+    KINDS = (
+        ('favorite', FavoriteList, 'favorites_count'),
+        ('shopping_cart', ShoppingCart, 'in_carts_count'),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass12345',
+            first_name='Cook', last_name='Book'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Суп', text='Описание', cooking_time=10,
+            image='recipes/images/soup.png'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def url(self, action, pk=None):
+        return f'/api/recipes/{pk or self.recipe.pk}/{action}/'
+
+    def check_linked(self, model, counter, linked):
+        self.assertEqual(
+            model.objects.filter(user=self.user, recipe=self.recipe).exists(),
+            linked
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(getattr(self.recipe, counter), int(linked))
+
+    def test_post_and_delete(self):
+        for action, model, counter in self.KINDS:
+            with self.subTest(action=action):
+                response = self.client.post(self.url(action))
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.data['id'], self.recipe.pk)
+                self.assertEqual(response.data['name'], self.recipe.name)
+                self.check_linked(model, counter, True)
+                response = self.client.post(self.url(action))
+                self.assertEqual(response.status_code, 400)
+                self.check_linked(model, counter, True)
+                response = self.client.delete(self.url(action))
+                self.assertEqual(response.status_code, 204)
+                self.check_linked(model, counter, False)
+                response = self.client.delete(self.url(action))
+                self.assertEqual(response.status_code, 400)
+                self.check_linked(model, counter, False)
+
+    def test_put_is_idempotent(self):
+        for action, model, counter in self.KINDS:
+            with self.subTest(action=action):
+                response = self.client.put(self.url(action))
+                self.assertEqual(response.status_code, 201)
+                response = self.client.put(self.url(action))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['id'], self.recipe.pk)
+                self.check_linked(model, counter, True)
+
+    def test_missing_recipe(self):
+        for action, model, counter in self.KINDS:
+            for method in ('post', 'put'):
+                with self.subTest(action=action, method=method):
+                    response = getattr(self.client, method)(
+                        self.url(action, 10 ** 6)
+                    )
+                    self.assertEqual(response.status_code, 404)
+            with self.subTest(action=action, method='delete'):
+                response = self.client.delete(self.url(action, 10 ** 6))
+                self.assertEqual(response.status_code, 400)
+            self.assertFalse(model.objects.exists())
+
+    def test_anonymous(self):
+        for action, model, counter in self.KINDS:
+            with self.subTest(action=action):
+                response = APIClient().post(self.url(action))
+                self.assertEqual(response.status_code, 401)
+
+
+class BulkTests(TestCase):
+    """Пакетные избранное и корзина: статусы, повторы, лимит, счётчики."""
+
+    KINDS = (
+        ('favorite', FavoriteList, 'favorites_count'),
+        ('shopping_cart', ShoppingCart, 'in_carts_count'),
+    )
+    MISSING = 10 ** 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass12345',
+            first_name='Cook', last_name='Book'
+        )
+        cls.first, cls.second = [
+            Recipe.objects.create(
+                author=cls.user, name=name, text='Описание', cooking_time=10,
+                image='recipes/images/soup.png'
+            )
+            for name in ('Суп', 'Каша')
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, method, action, ids):
+        return getattr(self.client, method)(
+            f'/api/recipes/{action}/bulk/', {'recipes': ids}, format='json'
+        )
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [
+            (item['id'], item['status'])
+            for item in response.data['recipes']
+        ]
+
+    def check_counters(self, counter, first, second):
+        for recipe, value in ((self.first, first), (self.second, second)):
+            recipe.refresh_from_db()
+            self.assertEqual(getattr(recipe, counter), value)
+
+    def test_add_and_remove(self):
+        for action, model, counter in self.KINDS:
+            with self.subTest(action=action):
+                model.objects.create(user=self.user, recipe=self.second)
+                response = self.bulk('post', action, [
+                    self.first.pk, self.second.pk, self.MISSING
+                ])
+                self.assertEqual(self.statuses(response), [
+                    (self.first.pk, 'added'),
+                    (self.second.pk, 'exists'),
+                    (self.MISSING, 'not_found'),
+                ])
+                self.check_counters(counter, 1, 1)
+                response = self.bulk('delete', action, [
+                    self.first.pk, self.MISSING
+                ])
+                self.assertEqual(self.statuses(response), [
+                    (self.first.pk, 'removed'),
+                    (self.MISSING, 'absent'),
+                ])
+                response = self.bulk('delete', action, [
+                    self.first.pk, self.second.pk
+                ])
+                self.assertEqual(self.statuses(response), [
+                    (self.first.pk, 'absent'),
+                    (self.second.pk, 'removed'),
+                ])
+                self.check_counters(counter, 0, 0)
+                self.assertFalse(model.objects.exists())
+
+    def test_duplicate_ids(self):
+        for action, model, counter in self.KINDS:
+            with self.subTest(action=action):
+                ids = [self.first.pk, self.first.pk, self.second.pk]
+                response = self.bulk('post', action, ids)
+                self.assertEqual(self.statuses(response), [
+                    (self.first.pk, 'added'), (self.second.pk, 'added'),
+                ])
+                self.check_counters(counter, 1, 1)
+                response = self.bulk('delete', action, ids)
+                self.assertEqual(self.statuses(response), [
+                    (self.first.pk, 'removed'), (self.second.pk, 'removed'),
+                ])
+                self.check_counters(counter, 0, 0)
+
+    def test_limit(self):
+        ids = list(range(self.MISSING, self.MISSING + 101))
+        for action, model, counter in self.KINDS:
+            for method in ('post', 'delete'):
+                with self.subTest(action=action, method=method):
+                    response = self.bulk(method, action, ids)
+                    self.assertEqual(response.status_code, 400)
+                    response = self.bulk(method, action, [])
+                    self.assertEqual(response.status_code, 400)
+                    response = self.bulk(method, action, ids[:100])
+                    self.assertEqual(len(self.statuses(response)), 100)
+        self.assertFalse(FavoriteList.objects.exists())
+        self.assertFalse(ShoppingCart.objects.exists())
+
+    def test_queries_do_not_grow(self):
+        ids = [self.first.pk, self.second.pk] + list(
+            range(self.MISSING, self.MISSING + 98)
+        )
+        for action, model, counter in self.KINDS:
+            with self.subTest(action=action):
+                counts = []
+                for batch in ([self.first.pk], ids):
+                    for method in ('post', 'delete'):
+                        with CaptureQueriesContext(connection) as context:
+                            self.bulk(method, action, batch)
+                        counts.append(len(context))
+                self.assertEqual(counts[:2], counts[2:])
+
+    def test_anonymous(self):
+        for action, model, counter in self.KINDS:
+            with self.subTest(action=action):
+                response = APIClient().post(
+                    f'/api/recipes/{action}/bulk/',
+                    {'recipes': [self.first.pk]}, format='json'
+                )
+                self.assertEqual(response.status_code, 401)
+
+    @skipUnless(connection.vendor == 'postgresql', 'только PostgreSQL')
+    def test_postgres_single_statement(self):
+        """Вставка и удаление пачки - по одному запросу к таблице связей."""
+        ids = [self.first.pk, self.second.pk, self.MISSING]
+        for action, model, counter in self.KINDS:
+            table = model._meta.db_table
+            for method in ('post', 'delete'):
+                with self.subTest(action=action, method=method):
+                    with CaptureQueriesContext(connection) as context:
+                        self.bulk(method, action, ids)
+                    statements = [
+                        query['sql'] for query in context.captured_queries
+                        if table in query['sql']
+                    ]
+                    self.assertEqual(len(statements), 1)
+                    self.assertIn('RETURNING', statements[0])
+
+
+class MembershipTests(TransactionTestCase):
+    """Флаги is_favorited и is_in_shopping_cart после переключений.
+
+    Кэш множеств сбрасывается после фиксации транзакции, поэтому
+    тест идёт без обёртки TestCase.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass12345',
+            first_name='Cook', last_name='Book'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Суп', text='Описание', cooking_time=10
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_flags_follow_toggles(self):
+        detail = f'/api/recipes/{self.recipe.pk}/'
+        for action, flag in (
+            ('favorite', 'is_favorited'),
+            ('shopping_cart', 'is_in_shopping_cart'),
+        ):
+            with self.subTest(action=action):
+                url = f'{detail}{action}/'
+                self.assertFalse(self.client.get(detail).data[flag])
+                self.client.post(url)
+                self.assertTrue(self.client.get(detail).data[flag])
+                self.client.delete(url)
+                self.assertFalse(self.client.get(detail).data[flag])
+
+
+class CatalogueVersionTests(TransactionTestCase):
+    """Версии справочников меняются только после фиксации транзакции."""
+
+    def test_version_bumped_on_commit(self):
+        for name, create in (
+            ('tags', lambda: Tag.objects.create(
+                name='Завтрак', color='#000000', slug='breakfast'
+            )),
+            ('ingredients', lambda: Ingredient.objects.create(
+                name='Соль', measurement_unit='г'
+            )),
+        ):
+            with self.subTest(name=name):
+                version = get_version(name)
+                with transaction.atomic():
+                    create()
+                    self.assertEqual(get_version(name), version)
+                self.assertNotEqual(get_version(name), version)
+
+
+class IngredientSearchTests(TestCase):
+    """Поиск ингредиентов идёт по индексу и не создаёт записей кэша."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Сахар', 'Сахарная пудра', 'Соль', 'Тростниковый сахар'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_search_is_not_cached(self):
+        with mock.patch('recipes.mixins.cache', wraps=cache) as spy:
+            for name in ('с', 'са', 'сах', 'саха', 'сахар'):
+                response = self.client.get(
+                    '/api/ingredients/', {'name': name}
+                )
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['name'] for item in response.json()],
+            ['Сахар', 'Сахарная пудра', 'Тростниковый сахар']
+        )
+        spy.set.assert_not_called()
+
+    def test_full_list_is_cached(self):
+        with mock.patch('recipes.mixins.cache', wraps=cache) as spy:
+            response = self.client.get('/api/ingredients/')
+            self.assertEqual(len(response.json()), 4)
+            self.assertEqual(spy.set.call_count, 1)
+            with self.assertNumQueries(0):
+                self.client.get('/api/ingredients/')
+            self.assertEqual(spy.set.call_count, 1)
+
+    def test_search_not_modified(self):
+        response = self.client.get('/api/ingredients/', {'name': 'соль'})
+        etag = response['ETag']
+        response = self.client.get(
+            '/api/ingredients/', {'name': 'соль'}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+
+@override_settings(SERVER_MODE='asgi')
+class AsyncViewTests(TestCase):
+    """В режиме ASGI попадания в кэш отдаются без запуска DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass12345',
+            first_name='Cook', last_name='Book'
+        )
+        Recipe.objects.create(
+            author=cls.user, name='Суп', text='Описание', cooking_time=10,
+            image='recipes/images/soup.png'
+        )
+        Tag.objects.create(name='Обед', color='#00FF00', slug='lunch')
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, viewset, path, **extra):
+        """Ответ view и число вызовов dispatch, то есть запусков DRF."""
+        view = viewset.as_view({'get': 'list'})
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        request = AsyncRequestFactory().get(path, **extra)
+        with mock.patch.object(
+            viewset, 'dispatch', autospec=True,
+            side_effect=viewset.dispatch
+        ) as dispatch:
+            response = async_to_sync(view)(request)
+        return response, dispatch.call_count
+
+    def test_wsgi_views_stay_sync(self):
+        with self.settings(SERVER_MODE='wsgi'):
+            view = TagViewSet.as_view({'get': 'list'})
+        self.assertFalse(asyncio.iscoroutinefunction(view))
+
+    def test_cache_hit_skips_drf(self):
+        for viewset, path in (
+            (TagViewSet, '/api/tags/'),
+            (IngredientViewSet, '/api/ingredients/'),
+            (RecipeViewSet, '/api/recipes/'),
+        ):
+            with self.subTest(path=path):
+                response, calls = self.get(viewset, path)
+                self.assertEqual(calls, 1)
+                content = response.content
+                with self.assertNumQueries(0):
+                    response, calls = self.get(viewset, path)
+                self.assertEqual(calls, 0)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, content)
+
+    def test_credentials_go_to_drf(self):
+        self.get(RecipeViewSet, '/api/recipes/')
+        response, calls = self.get(
+            RecipeViewSet, '/api/recipes/', AUTHORIZATION='Token invalid'
+        )
+        self.assertEqual(calls, 1)
+        self.assertEqual(response.status_code, 401)
+
+    def test_search_waits_for_index(self):
+        bump_version('ingredients')
+        path = '/api/ingredients/?name=%D1%81%D0%BE'
+        _, calls = self.get(IngredientViewSet, path)
+        self.assertEqual(calls, 1)
+        response, calls = self.get(IngredientViewSet, path)
+        self.assertEqual(calls, 0)
+        self.assertEqual(json.loads(response.content)[0]['name'], 'Соль')
@@ -0,0 +1,199 @@
+from collections import namedtuple
+
+from django.db import connection
+
+from backend.counters import change_counter
+
+from .membership import KINDS, invalidate_ids
+
+COUNTERS = {
+    'favorites': 'favorites_count',
+    'cart': 'in_carts_count',
+    'subscriptions': 'subscribers_count',
+}
+
+Link = namedtuple('Link', ('id', 'created', 'target'))
+
+
+def parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _describe(kind):
+    model, owner, target = KINDS[kind]
+    target_model = model._meta.get_field(target[:-len('_id')]).related_model
+    return model, owner, target, target_model
+
+
+def add_link(kind, owner_id, target_id, fields=()):
+    """Добавляет связь, если её ещё нет.
+
+    Возвращает Link с id связи, признаком создания и объектом цели,
+    в котором заполнены только fields; None, если цели не существует.
+    В PostgreSQL это один запрос INSERT ... ON CONFLICT DO NOTHING.
+    """
+    target_id = parse_id(target_id)
+    if target_id is None:
+        return None
+    if connection.vendor == 'postgresql':
+        return _insert_returning(kind, owner_id, target_id, fields)
+    model, owner, target, target_model = _describe(kind)
+    values = target_model.objects.filter(pk=target_id).values(*fields).first()
+    if values is None:
+        return None
+    link, created = model.objects.get_or_create(
+        **{owner: owner_id, target: target_id}
+    )
+    return Link(link.pk, created, target_model(pk=target_id, **values))
+
+
+def remove_link(kind, owner_id, target_id):
+    """Удаляет связь; возвращает True, если она существовала."""
+    target_id = parse_id(target_id)
+    if target_id is None:
+        return False
+    model, owner, target, target_model = _describe(kind)
+    if connection.vendor != 'postgresql':
+        deleted, _ = model.objects.filter(
+            **{owner: owner_id, target: target_id}
+        ).delete()
+        return deleted > 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {model._meta.db_table} '
+            f'WHERE {owner} = %s AND {target} = %s RETURNING 1',
+            [owner_id, target_id]
+        )
+        deleted = cursor.fetchone() is not None
+    if deleted:
+        change_counter(target_model, [target_id], COUNTERS[kind], -1)
+        invalidate_ids(kind, owner_id)
+    return deleted
+
+
+def _insert_returning(kind, owner_id, target_id, fields):
+    """Один запрос: проверка цели, вставка и нужные поля для ответа.
+
+    Сигналы не вызываются, поэтому счётчик и кэш обновляются здесь.
+    """
+    model, owner, target, target_model = _describe(kind)
+    table = model._meta.db_table
+    target_table = target_model._meta.db_table
+    target_pk = target_model._meta.pk.column
+    columns = ''.join(
+        f', {target_model._meta.get_field(name).column}' for name in fields
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH target AS ('
+            f'SELECT {target_pk}{columns} FROM {target_table} '
+            f'WHERE {target_pk} = %s), '
+            f'inserted AS ('
+            f'INSERT INTO {table} ({owner}, {target}) '
+            f'SELECT %s, {target_pk} FROM target '
+            f'ON CONFLICT DO NOTHING RETURNING id) '
+            f'SELECT COALESCE((SELECT id FROM inserted), ('
+            f'SELECT id FROM {table} WHERE {owner} = %s AND {target} = %s'
+            f')), EXISTS(SELECT 1 FROM inserted){columns} FROM target',
+            [target_id, owner_id, owner_id, target_id]
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    link_id, created, *values = row
+    if created:
+        change_counter(target_model, [target_id], COUNTERS[kind], 1)
+        invalidate_ids(kind, owner_id)
+    return Link(
+        link_id, created,
+        target_model(pk=target_id, **dict(zip(fields, values)))
+    )
+
+
+def add_links(kind, owner_id, target_ids):
+    """Добавляет связи с несколькими целями.
+
+    Возвращает множества существующих целей и целей, связь с которыми
+    создана этим вызовом. В PostgreSQL это один запрос с
+    INSERT ... ON CONFLICT DO NOTHING RETURNING, поэтому счётчики
+    меняются только на реально вставленные строки. В других СУБД
+    число запросов тоже не зависит от числа целей.
+    """
+    model, owner, target, target_model = _describe(kind)
+    if connection.vendor == 'postgresql':
+        found, created = _insert_many_returning(kind, owner_id, target_ids)
+    else:
+        found = set(target_model.objects.filter(
+            pk__in=target_ids
+        ).values_list('pk', flat=True))
+        created = found - set(model.objects.filter(
+            **{owner: owner_id, f'{target}__in': found}
+        ).values_list(target, flat=True))
+        model.objects.bulk_create(
+            [model(**{owner: owner_id, target: pk}) for pk in created],
+            ignore_conflicts=True
+        )
+    if created:
+        change_counter(target_model, created, COUNTERS[kind], 1)
+        invalidate_ids(kind, owner_id)
+    return found, created
+
+
+def _insert_many_returning(kind, owner_id, target_ids):
+    """Один запрос: существующие цели и вставленные связи с ними."""
+    model, owner, target, target_model = _describe(kind)
+    target_table = target_model._meta.db_table
+    target_pk = target_model._meta.pk.column
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH found AS ('
+            f'SELECT {target_pk} FROM {target_table} '
+            f'WHERE {target_pk} IN ({placeholders})), '
+            f'inserted AS ('
+            f'INSERT INTO {model._meta.db_table} ({owner}, {target}) '
+            f'SELECT %s, {target_pk} FROM found '
+            f'ON CONFLICT DO NOTHING RETURNING {target}) '
+            f'SELECT found.{target_pk}, inserted.{target} IS NOT NULL '
+            f'FROM found LEFT JOIN inserted '
+            f'ON inserted.{target} = found.{target_pk}',
+            [*target_ids, owner_id]
+        )
+        rows = cursor.fetchall()
+    found = {target_id for target_id, _ in rows}
+    created = {target_id for target_id, inserted in rows if inserted}
+    return found, created
+
+
+def remove_links(kind, owner_id, target_ids):
+    """Удаляет связи с несколькими целями; возвращает удалённые цели.
+
+    В PostgreSQL это один DELETE ... RETURNING, в других СУБД -
+    SELECT и DELETE. Сигналы не вызываются, поэтому счётчики и кэш
+    обновляются здесь.
+    """
+    model, owner, target, target_model = _describe(kind)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (
+        f'DELETE FROM {model._meta.db_table} '
+        f'WHERE {owner} = %s AND {target} IN ({placeholders})'
+    )
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'{sql} RETURNING {target}', [owner_id, *target_ids]
+            )
+            deleted = {target_id for target_id, in cursor.fetchall()}
+        else:
+            deleted = set(model.objects.filter(
+                **{owner: owner_id, f'{target}__in': target_ids}
+            ).values_list(target, flat=True))
+            if deleted:
+                cursor.execute(sql, [owner_id, *target_ids])
+    if deleted:
+        change_counter(target_model, deleted, COUNTERS[kind], -1)
+        invalidate_ids(kind, owner_id)
+    return deleted
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class FileTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Размер файла превышает допустимый.'
+    default_code = 'file_too_large'
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файл на диск частями и прерывает загрузку сверх лимита."""
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.file.close()
+            raise FileTooLarge()
+        return super().receive_data_chunk(raw_data, start)
@@ -0,0 +1,63 @@
+import csv
+import json
+
+from django.db.models import Sum
+
+from .models import RecipeIngredients
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def get_shopping_cart_ingredients(user):
+    """Суммирует ингредиенты корзины пользователя одним запросом."""
+    return RecipeIngredients.objects.filter(
+        recipe__shoppingcart__user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by('ingredient__name').iterator()
+
+
+def shopping_cart_txt(ingredients):
+    yield 'Список покупок: \n'
+    for item in ingredients:
+        yield (
+            f'{item["ingredient__name"]} '
+            f'({item["ingredient__measurement_unit"]}) - '
+            f'{item["total_amount"]} \n'
+        )
+
+
+def shopping_cart_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in ingredients:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['total_amount']
+        ))
+
+
+def shopping_cart_json(ingredients):
+    yield '['
+    for index, item in enumerate(ingredients):
+        yield (',' if index else '') + json.dumps({
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['total_amount']
+        }, ensure_ascii=False)
+    yield ']'
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': (shopping_cart_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_cart_csv, 'text/csv; charset=utf-8'),
+    'json': (shopping_cart_json, 'application/json'),
+}
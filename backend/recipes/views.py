@@ -1,61 +1,137 @@
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.exceptions import MethodNotAllowed, ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from api.serializers import (FavoriteANDShoppingListSerializer,
                              IngredientSerializer,
                              RecipeCreateUpdateSerializer, RecipeGETSerializer,
-                             TagSerializer)
+                             RecipeIdsSerializer, TagSerializer)
 
-from .filters import IngredientSearchFilter, RecipesFilter
-from .models import (FavoriteList, Ingredient, Recipe, RecipeIngredients,
-                     ShoppingCart, Tag)
+from .filters import RecipesFilter
+from .ingredient_index import ingredient_index
+from .mixins import AnonymousCacheMixin, CatalogueCacheMixin
+from .models import Ingredient, Recipe, Tag
 from .permissions import AuthorOrReadOnly
+from .renderers import CSVRenderer, PlainTextRenderer
+from .toggles import add_link, add_links, remove_link, remove_links
+from .uploadhandlers import LimitedTemporaryFileUploadHandler
+from .utils import SHOPPING_CART_FORMATS, get_shopping_cart_ingredients
+from backend.pagination import FoodgramCursorPagination
 
+RECIPE_SHORT_FIELDS = ('name', 'image', 'cooking_time')
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(CatalogueCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    authentication_classes = ()
+    permission_classes = (permissions.AllowAny,)
     pagination_class = None
+    catalogue_name = 'tags'
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogueCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (IngredientSearchFilter, )
-    search_fields = ('^name',)
+    authentication_classes = ()
+    permission_classes = (permissions.AllowAny,)
     pagination_class = None
+    catalogue_name = 'ingredients'
+
+    @classmethod
+    def cached_content(cls, request, *args, **kwargs):
+        """Поиск отдаётся без БД, только если индекс уже построен."""
+        name = request.GET.get('name')
+        if not name or kwargs:
+            return super().cached_content(request, *args, **kwargs)
+        return cls.search_response(request, name, build=False)
+
+    def list(self, request, *args, **kwargs):
+        """Список и поиск ингредиентов из индекса в памяти процесса.
 
+        Кэшируется только полный список: результаты поиска и так
+        собираются из индекса, а ключ на каждый префикс засорял бы кэш.
+        """
+        name = request.query_params.get('name')
+        if not name:
+            return self.cached_response(
+                self.all, request, *args, **kwargs
+            )
+        return self.search_response(request, name)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    @classmethod
+    def search_response(cls, request, name, build=True):
+        etag, _ = cls.catalogue_etag()
+        response = cls.not_modified(request, etag)
+        if response is not None:
+            return response
+        content = ingredient_index.search(
+            name, settings.INGREDIENT_SEARCH_LIMIT, build
+        )
+        if content is None:
+            return None
+        return cls.json_response(content, etag)
+
+    def all(self, request, *args, **kwargs):
+        return HttpResponse(
+            ingredient_index.all(), content_type='application/json'
+        )
+
+
+class RecipeViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (AuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filter_class = RecipesFilter
+    parser_classes = (JSONParser, MultiPartParser)
+
+    def initialize_request(self, request, *args, **kwargs):
+        """Файлы multipart сразу пишутся на диск с ограничением размера."""
+        request.upload_handlers = [LimitedTemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    @property
+    def paginator(self):
+        """Курсорная пагинация по ?pagination=cursor или ?cursor=.
+
+        Курсор задаёт порядок по дате, поэтому вместе с поиском,
+        который сортирует по релевантности, он не используется.
+        """
+        if not hasattr(self, '_paginator'):
+            query_params = self.request.query_params
+            if (
+                query_params.get('pagination') == 'cursor'
+                or 'cursor' in query_params
+            ):
+                if query_params.get('search'):
+                    raise ValidationError({'search': (
+                        'Поиск не поддерживает курсорную пагинацию.'
+                    )})
+                self._paginator = FoodgramCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self):
         queryset = Recipe.objects.all()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_related()
         is_favorited = self.request.query_params.get('is_favorited')
         is_in_shopping_cart = self.request.query_params.get(
             'is_in_shopping_cart'
         )
+        if is_favorited or is_in_shopping_cart:
+            queryset = queryset.annotate_user_flags(self.request.user)
         if is_favorited:
-            recipes_id = FavoriteList.objects.filter(
-                user=self.request.user
-            ).values('recipe')
-            queryset = Recipe.objects.filter(
-                id__in=(map(lambda x: x['recipe'], recipes_id))
-            )
+            queryset = queryset.filter(is_favorited=True)
         if is_in_shopping_cart:
-            recipes_id = ShoppingCart.objects.filter(
-                user=self.request.user
-            ).values('recipe')
-            queryset = Recipe.objects.filter(
-                id__in=(map(lambda x: x['recipe'], recipes_id))
-            )
+            queryset = queryset.filter(is_in_shopping_cart=True)
         return queryset
 
     def get_serializer_class(self):
@@ -75,98 +151,108 @@ class RecipeViewSet(viewsets.ModelViewSet):
             raise MethodNotAllowed(request.method)
         return super().update(request, *args, **kwargs)
 
-    @action(detail=True, methods=['post', 'delete'],
-            permission_classes=(permissions.IsAuthenticated,))
-    def favorite(self, request, pk):
-        if request.method == 'POST':
-            try:
-                favorite = FavoriteList.objects.create(
-                    user=self.request.user,
-                    recipe_id=pk
-                )
-                serializer = FavoriteANDShoppingListSerializer(favorite.recipe)
-                return Response(
-                    data=serializer.data,
-                    status=status.HTTP_201_CREATED
-                )
-            except:
-                return Response(
-                    {'detail': 'Рецепт уже находится в избранном.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+    def toggle(self, request, pk, kind, exists_message, missing_message):
+        """POST добавляет, PUT добавляет без ошибки на повтор, DELETE удаляет.
+
+        Каждое действие выполняется одним запросом к рецептам.
+        """
         if request.method == 'DELETE':
-            try:
-                favorite = FavoriteList.objects.get(
-                    user=self.request.user,
-                    recipe_id=pk
-                )
-                favorite.delete()
+            if remove_link(kind, request.user.pk, pk):
                 return Response(status=status.HTTP_204_NO_CONTENT)
-            except:
-                return Response(
-                    {'detail': 'Рецепт не найден в избранном.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            return Response(
+                {'detail': missing_message},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        link = add_link(kind, request.user.pk, pk, RECIPE_SHORT_FIELDS)
+        if link is None:
+            raise Http404
+        if not link.created and request.method == 'POST':
+            return Response(
+                {'detail': exists_message},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            data=FavoriteANDShoppingListSerializer(link.target).data,
+            status=status.HTTP_201_CREATED if link.created
+            else status.HTTP_200_OK
+        )
 
-    @action(detail=True, methods=['post', 'delete'],
+    @action(detail=True, methods=['post', 'put', 'delete'],
+            permission_classes=(permissions.IsAuthenticated,))
+    def favorite(self, request, pk):
+        return self.toggle(
+            request, pk, 'favorites',
+            'Рецепт уже находится в избранном.',
+            'Рецепт не найден в избранном.'
+        )
+
+    @action(detail=True, methods=['post', 'put', 'delete'],
             permission_classes=(permissions.IsAuthenticated, ))
     def shopping_cart(self, request, pk):
-        if request.method == 'POST':
-            try:
-                cartitem = ShoppingCart.objects.create(
-                    user=self.request.user,
-                    recipe_id=pk
-                )
-                serializer = FavoriteANDShoppingListSerializer(cartitem.recipe)
-                return Response(
-                    data=serializer.data,
-                    status=status.HTTP_201_CREATED
-                )
-            except:
-                return Response(
-                    {'detail': 'Рецепт уже находится в корзине.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        if request.method == 'DELETE':
-            try:
-                cartitem = get_object_or_404(
-                    ShoppingCart, user=self.request.user, recipe_id=pk
-                )
-                cartitem.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            except:
-                return Response(
-                    {'detail': 'Рецепт не найден в корзине.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        return self.toggle(
+            request, pk, 'cart',
+            'Рецепт уже находится в корзине.',
+            'Рецепт не найден в корзине.'
+        )
+
+    def bulk_add(self, kind, ids):
+        found, created = add_links(kind, self.request.user.pk, ids)
+        return {
+            pk: 'added' if pk in created
+            else 'exists' if pk in found else 'not_found'
+            for pk in ids
+        }
+
+    def bulk_remove(self, kind, ids):
+        deleted = remove_links(kind, self.request.user.pk, ids)
+        return {
+            pk: 'removed' if pk in deleted else 'absent' for pk in ids
+        }
+
+    def bulk_response(self, request, kind):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        handler = self.bulk_add if request.method == 'POST' else (
+            self.bulk_remove
+        )
+        with transaction.atomic():
+            statuses = handler(kind, ids)
+        return Response({'recipes': [
+            {'id': pk, 'status': item_status}
+            for pk, item_status in statuses.items()
+        ]})
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='favorite/bulk',
+            permission_classes=(permissions.IsAuthenticated,))
+    def favorite_bulk(self, request):
+        return self.bulk_response(request, 'favorites')
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart/bulk',
+            permission_classes=(permissions.IsAuthenticated,))
+    def shopping_cart_bulk(self, request):
+        return self.bulk_response(request, 'cart')
 
     @action(detail=False, methods=['get'],
-            permission_classes=(permissions.IsAuthenticated, ))
+            permission_classes=(permissions.IsAuthenticated, ),
+            renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer))
     def download_shopping_cart(self, request):
-        if self.request.user.is_authenticated:
-            shopping_list = ShoppingCart.objects.filter(
-                user=self.request.user
-            ).values('recipe')
-            ingredient_list = RecipeIngredients.objects.filter(
-                recipe_id__in=(map(lambda x: x['recipe'], shopping_list))
-            ).values('ingredient', 'amount')
-            shopping_cart_dict = {}
-            for item in ingredient_list:
-                ingredient = Ingredient.objects.get(id=item['ingredient'])
-                amount = item['amount']
-                if ingredient not in shopping_cart_dict:
-                    shopping_cart_dict[ingredient] = amount
-                else:
-                    shopping_cart_dict[ingredient] += amount
-            shopping_cart = 'Список покупок: \n'
-            for key in shopping_cart_dict:
-                shopping_cart += f'{key} - {shopping_cart_dict[key]} \n'
-            response = HttpResponse(shopping_cart, content_type='text/plain')
-            response['Content-Disposition'] = (
-                'attachment; filename="shopping_cart.txt"'
-            )
-            return response
-        return Response(
-            {'detail': 'Учетные данные не были предоставлены.'},
-            status=status.HTTP_401_UNAUTHORIZED
+        """Список покупок потоком в формате txt, csv или json.
+
+        ASGI-сервер перебирает поток в цикле событий, где ORM запрещён,
+        поэтому в этом режиме строки читаются заранее, в представлении.
+        """
+        file_format = request.accepted_renderer.format
+        generator, content_type = SHOPPING_CART_FORMATS[file_format]
+        ingredients = get_shopping_cart_ingredients(request.user)
+        if settings.SERVER_MODE == 'asgi':
+            ingredients = list(ingredients)
+        response = StreamingHttpResponse(
+            generator(ingredients), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"'
         )
+        return response
@@ -11,7 +11,10 @@ class UserAdmin(admin.ModelAdmin):
         'email',
         'first_name',
         'last_name',
+        'recipes_count',
+        'subscribers_count',
         'password')
+    readonly_fields = ('recipes_count', 'subscribers_count')
     search_fields = ('username',)
     list_filter = ('username', 'email')
 
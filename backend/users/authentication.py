@@ -0,0 +1,82 @@
+import time
+
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+CLAIMS = (
+    'username',
+    'email',
+    'first_name',
+    'last_name',
+    'is_staff',
+    'is_superuser',
+)
+
+
+def revoked_key(jti):
+    return f'jwt:revoked:{jti}'
+
+
+def revoke(token):
+    """Заносит jti access-токена в список отозванных до истечения его срока.
+
+    Список хранится в отдельном кэше 'shared' без вытеснения, чтобы
+    его не выдавил поток ответов в кэше по умолчанию. Refresh-токены
+    отзываются в БД через token_blacklist.
+    """
+    timeout = max(int(token['exp'] - time.time()), 1)
+    caches['shared'].set(
+        revoked_key(token[api_settings.JTI_CLAIM]), True, timeout
+    )
+
+
+def is_revoked(token):
+    return caches['shared'].get(
+        revoked_key(token[api_settings.JTI_CLAIM]), False
+    )
+
+
+def add_claims(token, user):
+    for claim in CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def user_from_claims(token):
+    """Пользователь из полей токена, без обращения к БД."""
+    user = User(
+        id=token[api_settings.USER_ID_CLAIM],
+        is_active=True,
+        **{claim: token[claim] for claim in CLAIMS}
+    )
+    user._state.adding = False
+    user._state.db = 'default'
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT-аутентификация: чтение по полям токена, запись по записи из БД.
+
+    Изменения профиля видны в GET-запросах после обновления access-токена.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        token = self.get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken('Токен отозван.')
+        if request.method in SAFE_METHODS and all(
+            claim in token for claim in CLAIMS
+        ):
+            return user_from_claims(token), token
+        return self.get_user(token), token
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.19 on 2026-10-18 17:23
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def remove_self_subscriptions(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Subscribe = apps.get_model('users', 'Subscribe')
+    self_subscriptions = Subscribe.objects.filter(user=F('subscriber'))
+    User.objects.filter(
+        pk__in=self_subscriptions.values('user'), subscribers_count__gt=0
+    ).update(subscribers_count=F('subscribers_count') - 1)
+    self_subscriptions.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_auto_20261018_1940'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_self_subscriptions, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='subscribe',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=F('subscriber')), name='no self subscribe'),
+        ),
+    ]
@@ -12,6 +12,12 @@ class User(AbstractUser):
     )
 
     email = models.EmailField(max_length=255, unique=True)
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False
+    )
 
     class Meta:
         ordering = ('id',)
@@ -43,6 +49,10 @@ class Subscribe(models.Model):
                 fields=['user', 'subscriber'],
                 name='unique subscribe'
             ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('subscriber')),
+                name='no self subscribe'
+            ),
         ]
 
     def __str__(self):
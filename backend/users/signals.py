@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from backend.counters import change_counter
+from recipes.membership import invalidate_ids
+
+from .models import Subscribe, User
+
+
+@receiver(post_save, sender=Subscribe)
+def increase_subscribers_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, [instance.user_id], 'subscribers_count', 1)
+        invalidate_ids('subscriptions', instance.subscriber_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def decrease_subscribers_count(sender, instance, **kwargs):
+    change_counter(User, [instance.user_id], 'subscribers_count', -1)
+    invalidate_ids('subscriptions', instance.subscriber_id)
@@ -0,0 +1,143 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import include, path
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.views import TokenRefreshView
+
+from .authentication import StatelessJWTAuthentication
+from .models import Subscribe, User
+from .views import CustomUserViewSet, TokenObtainView, logout
+
+JWT = {'authentication_classes': (StatelessJWTAuthentication,)}
+
+urlpatterns = [
+    path('api/auth/jwt/create/', TokenObtainView.as_view()),
+    path('api/auth/jwt/refresh/', TokenRefreshView.as_view()),
+    path('api/auth/jwt/logout/', logout.cls.as_view(**JWT)),
+    path('api/users/me/', CustomUserViewSet.as_view({'get': 'me'}, **JWT)),
+    path('api/', include('api.urls')),
+]
+
+
+@override_settings(ROOT_URLCONF='users.tests')
+class LogoutTests(TestCase):
+    """Отзыв JWT при выходе не зависит от режима AUTH_MODE и кэша."""
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass12345',
+            first_name='Cook', last_name='Book'
+        )
+        self.client = APIClient()
+        response = self.client.post('/api/auth/jwt/create/', {
+            'email': 'cook@example.com', 'password': 'pass12345'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.access = response.data['access']
+        self.refresh = response.data['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def logout(self):
+        response = self.client.post(
+            '/api/auth/jwt/logout/', {'refresh': self.refresh}
+        )
+        self.assertEqual(response.status_code, 204)
+
+    def churn(self):
+        for number in range(400):
+            self.client.get('/api/tags/', {'x': number})
+            self.client.get('/api/recipes/', {'page': number})
+        for number in range(2000):
+            cache.set(f'churn:{number}', number)
+
+    def test_logout_survives_cache_churn(self):
+        self.logout()
+        self.churn()
+        response = APIClient().post(
+            '/api/auth/jwt/refresh/', {'refresh': self.refresh}
+        )
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_rotated_refresh_is_rejected(self):
+        response = APIClient().post(
+            '/api/auth/jwt/refresh/', {'refresh': self.refresh}
+        )
+        self.assertEqual(response.status_code, 200)
+        response = APIClient().post(
+            '/api/auth/jwt/refresh/', {'refresh': self.refresh}
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+class SubscribeTests(TestCase):
+    """Подписка: POST, PUT и DELETE, повторы, подписка на себя."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.author = [
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='pass12345', first_name=name, last_name=name
+            )
+            for name in ('reader', 'author')
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def url(self, pk):
+        return f'/api/users/{pk}/subscribe/'
+
+    def check_subscribed(self, subscribed):
+        self.assertEqual(Subscribe.objects.filter(
+            user=self.author, subscriber=self.reader
+        ).exists(), subscribed)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, int(subscribed))
+
+    def test_post_and_delete(self):
+        response = self.client.post(self.url(self.author.pk))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['user'], self.author.pk)
+        self.assertEqual(response.data['subscriber'], self.reader.pk)
+        self.check_subscribed(True)
+        response = self.client.post(self.url(self.author.pk))
+        self.assertEqual(response.status_code, 400)
+        self.check_subscribed(True)
+        response = self.client.delete(self.url(self.author.pk))
+        self.assertEqual(response.status_code, 204)
+        self.check_subscribed(False)
+        response = self.client.delete(self.url(self.author.pk))
+        self.assertEqual(response.status_code, 400)
+        self.check_subscribed(False)
+
+    def test_put_is_idempotent(self):
+        response = self.client.put(self.url(self.author.pk))
+        self.assertEqual(response.status_code, 201)
+        response = self.client.put(self.url(self.author.pk))
+        self.assertEqual(response.status_code, 200)
+        self.check_subscribed(True)
+
+    def test_missing_author(self):
+        for method in ('post', 'put'):
+            with self.subTest(method=method):
+                response = getattr(self.client, method)(self.url(10 ** 6))
+                self.assertEqual(response.status_code, 404)
+        response = self.client.delete(self.url(10 ** 6))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Subscribe.objects.exists())
+
+    def test_self_subscription(self):
+        for pk in (self.reader.pk, f'0{self.reader.pk}'):
+            for method in ('post', 'put'):
+                with self.subTest(pk=pk, method=method):
+                    response = getattr(self.client, method)(self.url(pk))
+                    self.assertEqual(response.status_code, 400)
+        self.assertFalse(Subscribe.objects.exists())
+        self.reader.refresh_from_db()
+        self.assertEqual(self.reader.subscribers_count, 0)
@@ -1,14 +1,21 @@
-from django.db.models import Count, Q
-from django.shortcuts import get_object_or_404
+from django.db.models import (OuterRef, Prefetch, Subquery,
+                              prefetch_related_objects)
+from django.http import Http404
 from djoser import views
 from rest_framework import filters, permissions, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt import views as jwt_views
 
-from api.serializers import (PasswordSerializer, SubscribeSerializer,
-                             SubscribesListSerializer, UserCreateSerializer,
+from api.serializers import (LogoutSerializer, PasswordSerializer,
+                             SubscribeSerializer, SubscribesListSerializer,
+                             TokenObtainSerializer, UserCreateSerializer,
                              UserSerializer)
+from recipes.models import Recipe
+from recipes.toggles import add_link, parse_id, remove_link
 
+from .authentication import revoke
 from .models import Subscribe, User
 from .permissions import AdminOrUserOrReadOnly
 from backend.pagination import FoodgramPagination
@@ -39,64 +46,90 @@ class CustomUserViewSet(views.UserViewSet):
         return Response(serializer.errors,
                         status=status.HTTP_400_BAD_REQUEST)
 
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            return int(recipes_limit)
+        return None
+
     @action(detail=False, permission_classes=(permissions.IsAuthenticated,),
             methods=['get'],)
     def subscriptions(self, request):
-        queryset = User.objects.filter(
-            user__subscriber=request.user).annotate(
-                recipes_count=Count(
-                    'author', filter=Q(user__subscriber=request.user)
-                )
+        queryset = User.objects.filter(user__subscriber=request.user)
+        page = self.paginate_queryset(queryset)
+        authors = page if page is not None else list(queryset)
+        recipes = Recipe.objects.with_related()
+        recipes_limit = self.get_recipes_limit()
+        if recipes_limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:recipes_limit]
+            ))
+        prefetch_related_objects(
+            authors, Prefetch('author', queryset=recipes, to_attr='recipes')
         )
         serializer = SubscribesListSerializer(
-            queryset,
+            authors,
             many=True,
-            context={
-                'request': request,
-                'format': self.format_kwarg,
-                'view': self
-            }
+            context=self.get_serializer_context()
         )
-        page = self.paginate_queryset(queryset)
         if page is not None:
             return self.get_paginated_response(serializer.data)
         return Response(serializer.data)
 
-    @action(detail=True, methods=['post', 'delete'],)
+    @action(detail=True, methods=['post', 'put', 'delete'],)
     def subscribe(self, request, id):
-        if request.method == 'POST':
-            if int(id) == request.user.id:
-                return Response(
-                    {'status': 'Подписка на себя невозможна.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            if Subscribe.objects.filter(
-                user=get_object_or_404(User, id=id),
-                subscriber=self.request.user
-            ).exists():
-                return Response(
-                    {'status': 'Такая подписка уже существует.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            subscribe = Subscribe.objects.create(
-                user=get_object_or_404(User, id=id),
-                subscriber=self.request.user
+        """POST подписывает, PUT - без ошибки на повтор, DELETE отписывает."""
+        if request.method == 'DELETE':
+            if remove_link('subscriptions', request.user.pk, id):
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            return Response(
+                {'status': 'Такая подписка не существует.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            serializer = SubscribeSerializer(subscribe)
+        author_id = parse_id(id)
+        if author_id == request.user.pk:
             return Response(
-                data=serializer.data,
-                status=status.HTTP_201_CREATED
+                {'status': 'Подписка на себя невозможна.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-
-        if request.method == 'DELETE':
-            subscribe = get_object_or_404(
-                Subscribe,
-                user_id=id,
-                subscriber=self.request.user
+        link = add_link('subscriptions', request.user.pk, author_id)
+        if link is None:
+            raise Http404
+        if not link.created and request.method == 'POST':
+            return Response(
+                {'status': 'Такая подписка уже существует.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            subscribe.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        serializer = SubscribeSerializer(Subscribe(
+            id=link.id, user_id=link.target.pk, subscriber_id=request.user.pk
+        ))
+        return Response(
+            data=serializer.data,
+            status=status.HTTP_201_CREATED if link.created
+            else status.HTTP_200_OK
+        )
+
+
+class TokenObtainView(jwt_views.TokenObtainPairView):
+    """Выдача пары access/refresh JWT."""
+    serializer_class = TokenObtainSerializer
+
+
+@api_view(['POST'])
+@permission_classes((permissions.IsAuthenticated,))
+def logout(request):
+    """Заносит refresh-токен в чёрный список и отзывает текущий access."""
+    serializer = LogoutSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    refresh = serializer.validated_data['refresh']
+    if refresh.get('user_id') != request.user.pk:
         return Response(
-            {'status': 'Такая подписка не существует.'},
+            {'refresh': 'Токен выдан другому пользователю.'},
             status=status.HTTP_400_BAD_REQUEST
         )
+    refresh.blacklist()
+    if isinstance(request.auth, tokens.Token):
+        revoke(request.auth)
+    return Response(status=status.HTTP_204_NO_CONTENT)